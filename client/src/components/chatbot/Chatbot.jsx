@@ -9,6 +9,28 @@ import './Chatbot.css';
 // API configuration
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:8000';
 
+// How often and how long to wait for a queued document to be ingested
+const INGESTION_POLL_INTERVAL_MS = 1000;
+const INGESTION_POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
+// Poll an ingestion job until it is completed or failed; returns the final job
+const waitForIngestionJob = async (jobId) => {
+  const deadline = Date.now() + INGESTION_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const response = await fetch(`${API_BASE_URL}/api/rag/jobs/${jobId}`);
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Failed to get ingestion status');
+    }
+    const { job } = await response.json();
+    if (job.status === 'completed' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise(resolve => setTimeout(resolve, INGESTION_POLL_INTERVAL_MS));
+  }
+  throw new Error('Tài liệu vẫn đang được xử lý, vui lòng thử lại sau ít phút.');
+};
+
 const uploadDocument = async (file) => {
   try {
     const formData = new FormData();
@@ -24,11 +46,17 @@ const uploadDocument = async (file) => {
       throw new Error(error.detail || 'Failed to upload document');
     }
     
+    // The upload is only queued ("accepted"); report success once ingestion finishes
     const result = await response.json();
+    const job = result.status === 'accepted' ? await waitForIngestionJob(result.job_id) : result.job;
+    if (job && job.status === 'failed') {
+      throw new Error(job.error || 'Failed to process document');
+    }
     return {
+      ...result,
+      job,
       status: 'success',
-      message: `Tài liệu "${file.name}" đã được tải lên thành công. Bạn có thể hỏi các câu hỏi về nội dung tài liệu.`,
-      ...result
+      message: `Tài liệu "${file.name}" đã được tải lên thành công. Bạn có thể hỏi các câu hỏi về nội dung tài liệu.`
     };
   } catch (error) {
     console.error('Error uploading document:', error);
@@ -39,14 +67,16 @@ const uploadDocument = async (file) => {
   }
 };
 
-const queryRAG = async (message, context = null) => {
+const queryRAG = async (message, context = null, sessionId = null) => {
   try {
     const endpoint = `${API_BASE_URL}/api/rag/query`;
     console.log('Sending RAG query to:', endpoint);
     
     const payload = {
       message,
-      context: context || {}
+      context: context || {},
+      // The server keeps each session's recent turns for follow-up questions
+      session_id: sessionId
     };
     console.log('Request payload:', payload);
 
@@ -361,6 +391,8 @@ const Chatbot = () => {
   
   const messagesEndRef = useRef(null);
   const textareaRef = useRef(null);
+  // Unique per page load; combined with the conversation id it names the server-side chat session
+  const sessionPrefix = useRef(`${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`);
 
   // Auto-scroll to the bottom when new messages arrive
   useEffect(() => {
@@ -499,7 +531,7 @@ const Chatbot = () => {
               role: msg.isUser ? "user" : "assistant",
               content: msg.text
             }))
-        });
+        }, `${sessionPrefix.current}-${activeConversation}`);
 
         console.log('RAG response:', ragResponse);
         
@@ -7,6 +7,28 @@ import './chatbotBubble.css';
 // API configuration
 const API_BASE_URL = process.env.REACT_APP_API_BASE_URL || 'http://localhost:8000';
 
+// How often and how long to wait for a queued document to be ingested
+const INGESTION_POLL_INTERVAL_MS = 1000;
+const INGESTION_POLL_TIMEOUT_MS = 10 * 60 * 1000;
+
+// Poll an ingestion job until it is completed or failed; returns the final job
+const waitForIngestionJob = async (jobId) => {
+  const deadline = Date.now() + INGESTION_POLL_TIMEOUT_MS;
+  while (Date.now() < deadline) {
+    const response = await fetch(`${API_BASE_URL}/api/rag/jobs/${jobId}`);
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Failed to get ingestion status');
+    }
+    const { job } = await response.json();
+    if (job.status === 'completed' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise(resolve => setTimeout(resolve, INGESTION_POLL_INTERVAL_MS));
+  }
+  throw new Error('Tài liệu vẫn đang được xử lý, vui lòng thử lại sau ít phút.');
+};
+
 const uploadDocument = async (file) => {
   try {
     const formData = new FormData();
@@ -22,11 +44,17 @@ const uploadDocument = async (file) => {
       throw new Error(error.detail || 'Failed to upload document');
     }
     
+    // The upload is only queued ("accepted"); report success once ingestion finishes
     const result = await response.json();
+    const job = result.status === 'accepted' ? await waitForIngestionJob(result.job_id) : result.job;
+    if (job && job.status === 'failed') {
+      throw new Error(job.error || 'Failed to process document');
+    }
     return {
+      ...result,
+      job,
       status: 'success',
-      message: `Tài liệu "${file.name}" đã được tải lên thành công. Bạn có thể hỏi các câu hỏi về nội dung tài liệu.`,
-      ...result
+      message: `Tài liệu "${file.name}" đã được tải lên thành công. Bạn có thể hỏi các câu hỏi về nội dung tài liệu.`
     };
   } catch (error) {
     console.error('Error uploading document:', error);
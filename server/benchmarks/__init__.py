@@ -0,0 +1,3 @@
+"""
+Benchmarks for the Online Learning Platform API.
+"""
@@ -0,0 +1,295 @@
+"""
+Minimal in-memory stand-in for the Motor client, covering the queries and
+aggregation stages the learning-path service issues. latency_ms is awaited
+once per round trip so the number of database calls shows up in the
+timings; with transfer_mb_per_s set, returned documents also cost their
+BSON size, so shipping unused fields shows up too.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import bson
+from bson.objectid import ObjectId
+
+# Result of a field path that does not resolve
+_MISSING = object()
+
+
+def _values(doc: Dict[str, Any], field: str) -> List[Any]:
+    value = doc.get(field)
+    return value if isinstance(value, list) else [value]
+
+
+def _matches_condition(doc: Dict[str, Any], field: str, condition: Any) -> bool:
+    values = _values(doc, field)
+    if not isinstance(condition, dict):
+        return condition in values
+    for operator, operand in condition.items():
+        if operator == "$in":
+            if not any(value in operand for value in values):
+                return False
+        elif operator == "$nin":
+            if any(value in operand for value in values):
+                return False
+        elif operator == "$eq":
+            if operand not in values:
+                return False
+        elif operator == "$ne":
+            if operand in values:
+                return False
+        elif operator == "$exists":
+            if (field in doc) != bool(operand):
+                return False
+        else:
+            raise NotImplementedError(f"Unsupported operator: {operator}")
+    return True
+
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif not _matches_condition(doc, key, condition):
+            return False
+    return True
+
+
+def get_path(doc: Any, path: str) -> Any:
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return _MISSING
+        doc = doc[part]
+    return doc
+
+
+def _present(value: Any) -> bool:
+    return value is not _MISSING and value is not None
+
+
+def evaluate(expression: Any, doc: Dict[str, Any]) -> Any:
+    """Evaluate an aggregation expression (field paths and a few operators)."""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return get_path(doc, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, doc) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) != 1 or not next(iter(expression)).startswith("$"):
+        return {key: evaluate(value, doc) for key, value in expression.items()}
+
+    operator, operand = next(iter(expression.items()))
+    if operator == "$ifNull":
+        values = [evaluate(item, doc) for item in operand]
+        return next((value for value in values[:-1] if _present(value)), values[-1])
+    if operator == "$toLower":
+        value = evaluate(operand, doc)
+        return str(value).lower() if _present(value) else ""
+    if operator == "$eq":
+        left, right = (evaluate(item, doc) for item in operand)
+        return left == right
+    if operator == "$arrayElemAt":
+        array, index = (evaluate(item, doc) for item in operand)
+        return array[index] if isinstance(array, list) and -len(array) <= index < len(array) else _MISSING
+    if operator == "$cond":
+        condition, then, otherwise = operand
+        return evaluate(then if evaluate(condition, doc) else otherwise, doc)
+    raise NotImplementedError(f"Unsupported expression operator: {operator}")
+
+
+def _set_fields(doc: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(doc)
+    for key, expression in fields.items():
+        value = evaluate(expression, doc)
+        if value is _MISSING:
+            result.pop(key, None)
+        else:
+            result[key] = value
+    return result
+
+
+def _project(doc: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, Any]:
+    fields = {key: value for key, value in spec.items() if key != "_id"}
+    if fields and all(value in (0, False) for value in fields.values()):
+        result = {key: value for key, value in doc.items() if key not in fields}
+        if spec.get("_id", 1) in (0, False):
+            result.pop("_id", None)
+        return result
+
+    result = {}
+    if spec.get("_id", 1) not in (0, False) and "_id" in doc:
+        result["_id"] = doc["_id"] if spec.get("_id", 1) in (1, True) else evaluate(spec["_id"], doc)
+    for key, expression in fields.items():
+        value = get_path(doc, key) if expression in (1, True) else evaluate(expression, doc)
+        if value is not _MISSING:
+            result[key] = value
+    return result
+
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for doc in docs:
+        key = evaluate(spec["_id"], doc)
+        group = groups.setdefault(repr(key), {"_id": None if key is _MISSING else key})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            operator, expression = next(iter(accumulator.items()))
+            value = evaluate(expression, doc)
+            if operator == "$sum":
+                group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+            elif operator in ("$push", "$addToSet"):
+                values = group.setdefault(field, [])
+                if value is not _MISSING and (operator == "$push" or value not in values):
+                    values.append(value)
+            elif operator == "$first":
+                group.setdefault(field, None if value is _MISSING else value)
+            else:
+                raise NotImplementedError(f"Unsupported accumulator: {operator}")
+    return list(groups.values())
+
+
+def run_pipeline(database: "FakeDatabase", docs: List[Dict[str, Any]],
+                 pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, spec)]
+        elif name == "$lookup":
+            # Hash join, standing in for an index on the foreign field
+            foreign: Dict[Any, List[Dict[str, Any]]] = {}
+            for other in database[spec["from"]].docs:
+                for value in _values(other, spec["foreignField"]):
+                    foreign.setdefault(repr(value), []).append(other)
+            docs = [
+                {**doc, spec["as"]: [
+                    dict(other) for other in foreign.get(repr(get_path(doc, spec["localField"])), [])
+                ]}
+                for doc in docs
+            ]
+        elif name in ("$set", "$addFields"):
+            docs = [_set_fields(doc, spec) for doc in docs]
+        elif name == "$project":
+            docs = [_project(doc, spec) for doc in docs]
+        elif name == "$unwind":
+            path = spec if isinstance(spec, str) else spec["path"]
+            docs = [
+                {**doc, path[1:]: item}
+                for doc in docs
+                for item in (evaluate(path, doc) if isinstance(evaluate(path, doc), list) else [])
+            ]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$facet":
+            docs = [{key: run_pipeline(database, docs, sub_pipeline) for key, sub_pipeline in spec.items()}]
+        elif name == "$limit":
+            docs = docs[:spec]
+        else:
+            raise NotImplementedError(f"Unsupported aggregation stage: {name}")
+    return docs
+
+
+class FakeCursor:
+    def __init__(self, collection: "FakeCollection", query: Optional[Dict[str, Any]]):
+        self.collection = collection
+        self.query = query
+        self._limit = 0
+
+    def limit(self, count: int) -> "FakeCursor":
+        self._limit = count
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = []
+        cap = min(filter(None, [self._limit, length]), default=0)
+        for doc in self.collection.docs:
+            if matches(doc, self.query):
+                results.append(dict(doc))
+                if cap and len(results) >= cap:
+                    break
+        await self.collection.round_trip(results)
+        return results
+
+
+class FakeAggregationCursor:
+    def __init__(self, collection: "FakeCollection", pipeline: List[Dict[str, Any]]):
+        self.collection = collection
+        self.pipeline = pipeline
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        results = run_pipeline(self.collection.database, self.collection.docs, self.pipeline)[:length or None]
+        await self.collection.round_trip(results)
+        return results
+
+
+class FakeCollection:
+    def __init__(self, database: "FakeDatabase"):
+        self.docs: List[Dict[str, Any]] = []
+        self.database = database
+        self.round_trips = 0
+        self.bytes_returned = 0
+
+    async def round_trip(self, results: Optional[List[Dict[str, Any]]] = None):
+        self.round_trips += 1
+        size = sum(len(bson.encode(doc)) for doc in results or [])
+        self.bytes_returned += size
+        delay = self.database.latency_ms / 1000
+        if self.database.transfer_mb_per_s:
+            delay += size / (self.database.transfer_mb_per_s * 1e6)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def insert_many(self, docs: List[Dict[str, Any]]):
+        await self.round_trip()
+        for doc in docs:
+            doc.setdefault("_id", ObjectId())
+            self.docs.append(doc)
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        for doc in self.docs:
+            if matches(doc, query):
+                await self.round_trip([doc])
+                return dict(doc)
+        await self.round_trip()
+        return None
+
+    def find(self, query: Optional[Dict[str, Any]] = None) -> FakeCursor:
+        return FakeCursor(self, query)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> FakeAggregationCursor:
+        return FakeAggregationCursor(self, pipeline)
+
+
+class FakeDatabase:
+    def __init__(self, latency_ms: float, transfer_mb_per_s: float = 0.0):
+        self.latency_ms = latency_ms
+        self.transfer_mb_per_s = transfer_mb_per_s
+        self.collections: Dict[str, FakeCollection] = {}
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(self)
+        return self.collections[name]
+
+    def round_trips(self) -> int:
+        return sum(collection.round_trips for collection in self.collections.values())
+
+    def bytes_returned(self) -> int:
+        return sum(collection.bytes_returned for collection in self.collections.values())
+
+
+class FakeMongoClient:
+    """Drop-in for AsyncIOMotorClient where only get_default_database() is used."""
+
+    def __init__(self, latency_ms: float = 0.0, transfer_mb_per_s: float = 0.0):
+        self.db = FakeDatabase(latency_ms, transfer_mb_per_s)
+
+    def get_default_database(self) -> FakeDatabase:
+        return self.db
@@ -0,0 +1,287 @@
+"""
+Benchmark the RAG and learning-path hot paths without network access.
+
+RAGService runs against hashed bag-of-words embeddings, a fixed-answer chat
+model and scratch storage; LearningPathService runs against an in-memory
+MongoDB stand-in seeded with synthetic users, progress records and courses.
+Simulated API and database latencies are configurable so round-trip savings
+are visible. Each stage reports latency percentiles, throughput and memory.
+
+Usage (from the server directory):
+    python -m benchmarks.hot_paths_benchmark --documents 50 --queries 200 --users 1000 --output results.json
+"""
+from typing import Any, Awaitable, Callable, Dict, List
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import HashEmbeddings, FakeChatModel
+from benchmarks.fake_mongo import FakeMongoClient
+from benchmarks.vector_store_benchmark import current_rss_mb
+
+STAGES = ["add_document", "get_relevant_context", "query", "follow_up_query", "get_user_details",
+          "get_recommended_courses"]
+
+TOPICS = {
+    "IT3100": "lập trình hướng đối tượng lớp đối tượng kế thừa đa hình đóng gói giao diện phương thức",
+    "MI1111": "giải tích đạo hàm tích phân giới hạn chuỗi hàm số liên tục cực trị",
+    "IT3080": "mạng máy tính giao thức định tuyến gói tin TCP IP tầng ứng dụng",
+    "IT3090": "cơ sở dữ liệu truy vấn chỉ mục giao dịch chuẩn hóa khóa chính bảng",
+    "IT4772": "học máy hồi quy phân lớp mạng nơ ron huấn luyện mô hình dữ liệu",
+}
+FILLER = "sinh viên bài giảng ví dụ chương phần khái niệm định nghĩa bài tập kiểm tra tài liệu".split()
+CATEGORIES = ["Programming", "Mathematics", "Networking", "Databases", "AI"]
+SKILLS = ["python", "java", "sql", "algorithms", "statistics", "networking", "ml", "calculus"]
+
+
+def make_corpus(rng: random.Random, num_documents: int, paragraphs: int) -> List[str]:
+    codes = list(TOPICS)
+    documents = []
+    for i in range(num_documents):
+        code = codes[i % len(codes)]
+        words = TOPICS[code].split() + FILLER
+        text = [
+            f"{code} chương {p + 1}. " + " ".join(rng.choice(words) for _ in range(rng.randint(40, 120)))
+            for p in range(paragraphs)
+        ]
+        documents.append("\n\n".join(text))
+    return documents
+
+
+def make_queries(rng: random.Random, num_queries: int) -> List[str]:
+    codes = list(TOPICS)
+    queries = []
+    for i in range(num_queries):
+        code = rng.choice(codes)
+        words = rng.sample(TOPICS[code].split(), 4)
+        # The index keeps every question distinct, so answers are not served from cache
+        queries.append(f"{code} {' '.join(words)} là gì? (câu hỏi {i})")
+    return queries
+
+
+async def seed_database(client: FakeMongoClient, rng: random.Random, num_users: int,
+                        num_courses: int, progress_per_user: int):
+    db = client.get_default_database()
+    now = datetime.utcnow()
+    await db.Course.insert_many([
+        {
+            "CourseCode": f"C{j:04d}",
+            "Name": f"Khóa học {j}",
+            "category": CATEGORIES[j % len(CATEGORIES)],
+            "skillTags": rng.sample(SKILLS, 2),
+            "Status": "Active" if j % 10 else "Inactive",
+        }
+        for j in range(num_courses)
+    ])
+    await db.User.insert_many([{"UserCode": f"U{i:05d}", "Name": f"Học viên {i}"} for i in range(num_users)])
+    progress = []
+    for i in range(num_users):
+        for j in rng.sample(range(num_courses), min(progress_per_user, num_courses)):
+            progress.append({
+                "UserCode": f"U{i:05d}",
+                "CourseCode": f"C{j:04d}",
+                "progress": rng.randint(0, 100),
+                "status": "completed" if rng.random() < 0.4 else "in_progress",
+                "timeSpent": rng.randint(10, 600),
+                "lastAccessed": now - timedelta(days=rng.randint(0, 90)),
+            })
+    await db.UserProgress.insert_many(progress)
+
+
+def summarize(stage: str, latencies: List[float], errors: int, wall_seconds: float,
+              rss_before: float, trace_memory: bool) -> Dict[str, Any]:
+    values = np.array(latencies) if latencies else np.zeros(1)
+    result = {
+        "stage": stage,
+        "calls": len(latencies),
+        "errors": errors,
+        "latency_ms_p50": round(float(np.percentile(values, 50)), 3),
+        "latency_ms_p95": round(float(np.percentile(values, 95)), 3),
+        "latency_ms_p99": round(float(np.percentile(values, 99)), 3),
+        "latency_ms_max": round(float(values.max()), 3),
+        "throughput_per_second": round(len(latencies) / wall_seconds, 1) if wall_seconds else 0.0,
+        "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if trace_memory:
+        result["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    return result
+
+
+async def run_stage(stage: str, calls: List[Callable[[], Awaitable[Any]]], concurrency: int,
+                    trace_memory: bool) -> Dict[str, Any]:
+    """Run calls with at most `concurrency` in flight and time each one."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def timed(call: Callable[[], Awaitable[Any]]):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await call()
+                if isinstance(result, dict) and result.get("status") == "error":
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    if trace_memory:
+        tracemalloc.reset_peak()
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(call) for call in calls))
+    wall_seconds = time.perf_counter() - start
+    return summarize(stage, latencies, errors, wall_seconds, rss_before, trace_memory)
+
+
+async def run(args: Dict[str, Any], scratch_dir: str) -> Dict[str, Any]:
+    from services.ragService import RAGService
+    from services.learning_path import LearningPathService
+    from services.course_catalog import CourseCatalog
+
+    rng = random.Random(args["seed"])
+    embeddings = HashEmbeddings(dim=args["dim"], latency_ms=args["embedding_latency_ms"])
+    llm = FakeChatModel(latency_ms=args["llm_latency_ms"])
+    condense_llm = FakeChatModel(answer="Câu hỏi độc lập?", latency_ms=args["condense_latency_ms"])
+    rag = RAGService(
+        embeddings=embeddings,
+        llm=llm,
+        condense_llm=condense_llm,
+        vector_store_dir=os.path.join(scratch_dir, "vector_store"),
+        lexical_index_path=os.path.join(scratch_dir, "lexical_index.sqlite"),
+        document_registry_path=os.path.join(scratch_dir, "document_registry.sqlite"),
+        embedding_cache_path=os.path.join(scratch_dir, "embedding_cache.sqlite"),
+    )
+
+    corpus_dir = os.path.join(scratch_dir, "corpus")
+    os.makedirs(corpus_dir)
+    paths = []
+    for i, text in enumerate(make_corpus(rng, args["documents"], args["paragraphs"])):
+        paths.append(os.path.join(corpus_dir, f"document_{i:04d}.txt"))
+        with open(paths[-1], "w", encoding="utf-8") as f:
+            f.write(text)
+    queries = make_queries(rng, args["queries"])
+    # Each follow-up continues its own session that already holds one turn
+    for i, q in enumerate(queries):
+        rag.sessions.append_turn(f"session-{i}", q, "Câu trả lời trước.")
+
+    client = FakeMongoClient(latency_ms=args["db_latency_ms"])
+    await seed_database(client, rng, args["users"], args["courses"], args["progress_per_user"])
+    catalog = None
+    if args["course_catalog"]:
+        catalog = CourseCatalog(client.get_default_database())
+        await catalog.start()
+    learning_path = LearningPathService(client, catalog=catalog)
+    user_codes = [f"U{rng.randrange(args['users']):05d}" for _ in range(args["lookups"])]
+
+    stages: Dict[str, List[Callable[[], Awaitable[Any]]]] = {
+        "add_document": [lambda path=path: rag.add_document(path) for path in paths],
+        "get_relevant_context": [lambda q=q: rag.get_relevant_context(q) for q in queries],
+        "query": [lambda q=q: rag.query(q) for q in queries],
+        "follow_up_query": [
+            lambda i=i, q=q: rag.query(f"Giải thích thêm về ý đó? ({q})", session_id=f"session-{i}",
+                                       condense_mode=args["condense_mode"])
+            for i, q in enumerate(queries)
+        ],
+        "get_user_details": [lambda code=code: learning_path.get_user_details(code) for code in user_codes],
+        "get_recommended_courses": [
+            lambda code=code: learning_path.get_recommended_courses(code) for code in user_codes
+        ],
+    }
+
+    if args["trace_memory"]:
+        tracemalloc.start()
+    results = []
+    for stage in args["stages"]:
+        # Ingestion is serialized per document; the other stages model concurrent users
+        concurrency = 1 if stage == "add_document" else args["concurrency"]
+        print(f"Running {stage} ({len(stages[stage])} calls, concurrency {concurrency})...")
+        results.append(await run_stage(stage, stages[stage], concurrency, args["trace_memory"]))
+    if args["trace_memory"]:
+        tracemalloc.stop()
+    if catalog:
+        await catalog.stop()
+
+    return {
+        "results": results,
+        "counters": {
+            "embedding_calls": embeddings.calls,
+            "embedded_texts": embeddings.texts,
+            "llm_calls": llm.calls,
+            "condense_calls": condense_llm.calls,
+            "db_round_trips": client.get_default_database().round_trips(),
+            "indexed_chunks": rag.lexical_index.count(),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG and learning-path hot paths offline")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--paragraphs", type=int, default=30, help="Paragraphs per synthetic document")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--progress-per-user", type=int, default=10)
+    parser.add_argument("--lookups", type=int, default=200, help="get_user_details calls")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension")
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--condense-latency-ms", type=float, default=60.0)
+    parser.add_argument("--condense-mode", choices=["condense", "recent_turns"], default="condense",
+                        help="How follow_up_query handles chat history")
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    parser.add_argument("--no-course-catalog", dest="course_catalog", action="store_false",
+                        help="Send recommendation queries to the database instead of the in-memory catalog")
+    parser.add_argument("--trace-memory", action="store_true", help="Also report Python heap peaks (slower)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = vars(parser.parse_args())
+
+    scratch_dir = tempfile.mkdtemp(prefix="bench_hot_paths_")
+    # Importing the RAG module builds its default singleton; keep it off the
+    # real data directory and away from the network
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    for variable, name in [
+        ("RAG_VECTOR_STORE_DIR", "default_vector_store"),
+        ("RAG_LEXICAL_INDEX_PATH", "default_lexical_index.sqlite"),
+        ("RAG_DOCUMENT_REGISTRY_PATH", "default_document_registry.sqlite"),
+        ("RAG_EMBEDDING_CACHE_PATH", "default_embedding_cache.sqlite"),
+    ]:
+        os.environ[variable] = os.path.join(scratch_dir, name)
+
+    try:
+        report = asyncio.run(run(args, scratch_dir))
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    columns = list(report["results"][0].keys())
+    print("\n" + " | ".join(columns))
+    for result in report["results"]:
+        print(" | ".join(str(result.get(column, "")) for column in columns))
+    print(f"\nCounters: {report['counters']}")
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump({"config": args, **report}, f, indent=2)
+        print(f"\nResults written to {args['output']}")
+
+
+if __name__ == "__main__":
+    main()
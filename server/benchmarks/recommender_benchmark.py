@@ -0,0 +1,127 @@
+"""
+Benchmark the vectorized course recommender on a synthetic catalog.
+
+Courses get random categories and skill tags, users random completed and
+in-progress courses. The catalog is loaded into a CourseCatalog from the
+in-memory MongoDB stand-in, then users are scored one at a time (as the
+recommendations endpoint does) and all at once in batch mode. Batch results
+are checked against the per-user ones, and each top-k against a full sort
+of the same scores.
+
+Usage (from the server directory):
+    python -m benchmarks.recommender_benchmark --courses 5000 --users 10000 --output results.json
+"""
+from typing import Any, Dict, List
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_mongo import FakeMongoClient
+from services.course_catalog import CourseCatalog
+from services.recommender import CourseRecommender
+
+
+def make_learning_status(rng: random.Random, courses: List[Dict[str, Any]], num_courses: int) -> Dict[str, Any]:
+    status = {"completed_courses": [], "in_progress_courses": [], "skill_levels": {}}
+    for course in rng.sample(courses, num_courses):
+        info = {"course_id": course["CourseCode"], "category": course["category"], "progress": rng.randint(0, 100)}
+        if rng.random() < 0.5:
+            status["completed_courses"].append(info)
+            for skill in course["skillTags"]:
+                status["skill_levels"][skill] = status["skill_levels"].get(skill, 0) + 1
+        else:
+            status["in_progress_courses"].append(info)
+    return status
+
+
+async def run(args: Dict[str, Any]) -> Dict[str, Any]:
+    rng = random.Random(args["seed"])
+    skills = [f"skill-{i}" for i in range(args["skills"])]
+    courses = [
+        {
+            "CourseCode": f"C{j:05d}",
+            "Name": f"Khóa học {j}",
+            "category": f"category-{rng.randrange(args['categories'])}",
+            "skillTags": rng.sample(skills, rng.randint(1, 4)),
+            "Status": "Active",
+        }
+        for j in range(args["courses"])
+    ]
+    client = FakeMongoClient()
+    await client.get_default_database().Course.insert_many([dict(course) for course in courses])
+    catalog = CourseCatalog(client.get_default_database(), max_staleness_seconds=3600)
+    await catalog.refresh()
+    recommender = CourseRecommender(catalog)
+
+    start = time.perf_counter()
+    matrix = recommender.matrix()
+    build_ms = (time.perf_counter() - start) * 1000
+
+    statuses = [make_learning_status(rng, courses, args["courses_per_user"]) for _ in range(args["users"])]
+
+    single_ms, single = [], []
+    for status in statuses[:args["single_users"]]:
+        start = time.perf_counter()
+        single.append(recommender.recommend(status, k=args["k"]))
+        single_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    batch = recommender.recommend_batch(statuses, k=args["k"])
+    batch_seconds = time.perf_counter() - start
+
+    # Batch mode must agree with per-user calls, and top-k with a full sort (compared
+    # by score, since equally scored courses may legitimately swap)
+    for status, one, many in zip(statuses, single, batch):
+        if not np.allclose([c["score"] for c in one], [c["score"] for c in many], atol=1e-4):
+            raise AssertionError("Batch and per-user recommendations differ")
+        scores = matrix.features @ matrix.encode_user(status)
+        scores[matrix.excluded_positions(status)] = -np.inf
+        best = np.sort(scores)[::-1][:args["k"]]
+        if not np.allclose(best, [c["score"] for c in one], atol=1e-4):
+            raise AssertionError("Top-k differs from a full sort of the scores")
+
+    values = np.array(single_ms)
+    return {
+        "courses": args["courses"],
+        "features": int(matrix.features.shape[1]),
+        "matrix_build_ms": round(build_ms, 1),
+        "single_ms_p50": round(float(np.percentile(values, 50)), 3),
+        "single_ms_p95": round(float(np.percentile(values, 95)), 3),
+        "batch_users": args["users"],
+        "batch_seconds": round(batch_seconds, 3),
+        "batch_users_per_second": round(args["users"] / batch_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized course recommender")
+    parser.add_argument("--courses", type=int, default=5000)
+    parser.add_argument("--skills", type=int, default=300)
+    parser.add_argument("--categories", type=int, default=30)
+    parser.add_argument("--users", type=int, default=10000, help="Users scored in batch mode")
+    parser.add_argument("--single-users", type=int, default=200, help="Users scored one at a time")
+    parser.add_argument("--courses-per-user", type=int, default=10)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = vars(parser.parse_args())
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(f"{key}: {value}")
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump({"config": args, "result": result}, f, indent=2)
+        print(f"\nResults written to {args['output']}")
+
+
+if __name__ == "__main__":
+    main()
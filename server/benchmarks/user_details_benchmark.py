@@ -0,0 +1,218 @@
+"""
+Compare the two get_user_details implementations: separate User, UserProgress
+and Course queries with the learning status built in Python ("find"), and
+one $lookup aggregation pipeline ("aggregate").
+
+Seeds users with 10, 100 and 1,000 progress records. Seeded courses carry
+descriptions and lesson lists like the real ones, so the cost of
+transferring whole course documents is visible. Both implementations must
+return the same learning status.
+
+By default this runs against the in-memory MongoDB stand-in, whose pipeline
+emulation says nothing about server-side cost, so only round trips and
+kilobytes returned per call are reported. With --mongodb-url it seeds a real
+mongod instead (the database named in the URL must be empty; it is dropped
+afterwards), creates the server's indexes and also reports latency.
+
+Usage (from the server directory):
+    python -m benchmarks.user_details_benchmark --records 10 100 1000 --lookups 50
+    python -m benchmarks.user_details_benchmark --mongodb-url mongodb://localhost:27017/user_details_benchmark
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+import bson
+import numpy as np
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from pymongo.errors import ConfigurationError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_mongo import FakeMongoClient
+from services.learning_path import LearningPathService, DETAILS_QUERIES
+from services.mongo_indexes import ensure_indexes
+
+CATEGORIES = ["Programming", "Data Science", "Networking", "Mathematics", "Design"]
+SKILLS = ["python", "sql", "statistics", "algorithms", "linux", "ml", "web", "security"]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands a real client sends and the BSON size of their replies."""
+
+    def __init__(self):
+        self.commands = 0
+        self.reply_bytes = 0
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        pass
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.commands += 1
+        self.reply_bytes += len(bson.encode(event.reply))
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.commands += 1
+
+    def round_trips(self) -> int:
+        return self.commands
+
+    def bytes_returned(self) -> int:
+        return self.reply_bytes
+
+
+async def open_database(mongodb_url: Optional[str]) -> Tuple[Any, Any]:
+    """The client to benchmark and the object counting its round trips and bytes."""
+    if not mongodb_url:
+        client = FakeMongoClient()
+        return client, client.get_default_database()
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(mongodb_url, serverSelectionTimeoutMS=30000, event_listeners=[counter])
+    try:
+        db = client.get_default_database()
+    except ConfigurationError:
+        client.close()
+        raise SystemExit("--mongodb-url must name a database, e.g. mongodb://localhost:27017/user_details_benchmark")
+    if await db.list_collection_names():
+        client.close()
+        raise SystemExit(f"Database {db.name} is not empty; point --mongodb-url at a scratch database")
+    return client, counter
+
+
+async def seed_database(client: Any, rng: random.Random, records: List[int],
+                        users_per_size: int, num_courses: int, description_chars: int):
+    db = client.get_default_database()
+    await db.Course.insert_many([
+        {
+            "CourseCode": f"C{j:05d}",
+            "Name": f"Khóa học {j}",
+            "category": CATEGORIES[j % len(CATEGORIES)],
+            "skillTags": rng.sample(SKILLS, 2),
+            "Status": "Active",
+            "Description": "Mô tả khóa học " * (description_chars // 15),
+            "Lessons": [{"title": f"Bài {k}", "duration": 45} for k in range(20)],
+        }
+        for j in range(num_courses)
+    ])
+
+    now = datetime.utcnow()
+    users, progress = [], []
+    for count in records:
+        for i in range(users_per_size):
+            user_code = f"U{count}-{i}"
+            users.append({"UserCode": user_code, "Name": f"Học viên {user_code}"})
+            for j in rng.sample(range(num_courses), count):
+                progress.append({
+                    "UserCode": user_code,
+                    "CourseCode": f"C{j:05d}",
+                    "progress": rng.randint(0, 100),
+                    "status": "completed" if rng.random() < 0.4 else "in_progress",
+                    "timeSpent": rng.randint(10, 600),
+                    "lastAccessed": now - timedelta(days=rng.randint(0, 90)),
+                })
+    await db.User.insert_many(users)
+    await db.UserProgress.insert_many(progress)
+
+
+def comparable(details: Dict[str, Any]) -> Dict[str, Any]:
+    status = details["learning_status"]
+    return {
+        "user": details["user"]["UserCode"],
+        "completed_courses": sorted(status["completed_courses"], key=lambda course: course["course_id"]),
+        "in_progress_courses": sorted(status["in_progress_courses"], key=lambda course: course["course_id"]),
+        "total_learning_time": status["total_learning_time"],
+        "skill_levels": status["skill_levels"],
+        "preferred_categories": status["preferred_categories"],
+    }
+
+
+async def run(args: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rng = random.Random(args["seed"])
+    client, traffic = await open_database(args["mongodb_url"])
+    try:
+        await seed_database(client, rng, args["records"], args["users_per_size"],
+                            max(args["courses"], max(args["records"])), args["description_chars"])
+        if args["mongodb_url"]:
+            await ensure_indexes(client.get_default_database())
+        return await measure(args, rng, client, traffic)
+    finally:
+        if args["mongodb_url"]:
+            await client.drop_database(client.get_default_database().name)
+            client.close()
+
+
+async def measure(args: Dict[str, Any], rng: random.Random, client: Any, traffic: Any) -> List[Dict[str, Any]]:
+    services = {query: LearningPathService(client, details_query=query) for query in DETAILS_QUERIES}
+    # Emulated pipelines run in Python, so their timings say nothing about a real server
+    timed = bool(args["mongodb_url"])
+
+    results = []
+    for count in args["records"]:
+        user_codes = [f"U{count}-{rng.randrange(args['users_per_size'])}" for _ in range(args["lookups"])]
+        expected = None
+        for query, service in services.items():
+            if timed:
+                # Connections and plan caches are warm before timing
+                await service.get_user_details(user_codes[0])
+            latencies = []
+            round_trips, transferred = traffic.round_trips(), traffic.bytes_returned()
+            for user_code in user_codes:
+                start = time.perf_counter()
+                details = await service.get_user_details(user_code)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            # Both implementations must agree on the last user's learning status
+            if expected is None:
+                expected = comparable(details)
+            elif comparable(details) != expected:
+                raise AssertionError(f"{query} returned a different learning status for {user_code}")
+
+            result = {
+                "records": count,
+                "query": query,
+                "round_trips_per_call": round((traffic.round_trips() - round_trips) / len(user_codes), 2),
+                "kb_returned_per_call": round((traffic.bytes_returned() - transferred) / len(user_codes) / 1024, 1),
+            }
+            if timed:
+                values = np.array(latencies)
+                result["latency_ms_p50"] = round(float(np.percentile(values, 50)), 3)
+                result["latency_ms_p95"] = round(float(np.percentile(values, 95)), 3)
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_user_details: separate queries vs. aggregation")
+    parser.add_argument("--records", nargs="+", type=int, default=[10, 100, 1000],
+                        help="Progress records per user, one scenario each")
+    parser.add_argument("--users-per-size", type=int, default=5)
+    parser.add_argument("--courses", type=int, default=2000)
+    parser.add_argument("--description-chars", type=int, default=2000, help="Size of each course description")
+    parser.add_argument("--lookups", type=int, default=50, help="get_user_details calls per scenario")
+    parser.add_argument("--mongodb-url", help="Seed and time a real mongod; the database in the URL must be empty")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = vars(parser.parse_args())
+
+    results = asyncio.run(run(args))
+
+    columns = list(results[0].keys())
+    print("\n" + " | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump({"config": args, "results": results}, f, indent=2)
+        print(f"\nResults written to {args['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Compare the Chroma and NumPy vector store backends on a synthetic corpus.
+
+Embeddings are generated locally (clustered Gaussian vectors), so the
+benchmark needs no network access. Each backend runs in its own process
+to keep memory figures independent.
+
+Usage (from the server directory):
+    python -m benchmarks.vector_store_benchmark --chunks 50000 --dim 1536
+"""
+from typing import Dict, Any, List
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.vector_store import create_vector_store
+
+
+class LookupEmbeddings(Embeddings):
+    """Returns precomputed vectors for texts named "chunk-<i>" and "query-<i>"."""
+
+    def __init__(self, corpus: np.ndarray, queries: np.ndarray):
+        self.corpus = corpus
+        self.queries = queries
+
+    def _vector(self, text: str) -> List[float]:
+        kind, index = text.split("-")
+        matrix = self.corpus if kind == "chunk" else self.queries
+        return matrix[int(index)].tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+def make_dataset(num_chunks: int, num_queries: int, dim: int, seed: int):
+    """Clustered unit vectors, plus queries drawn near random corpus points."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(num_chunks // 100, 1), dim)).astype(np.float32)
+    labels = rng.integers(0, centers.shape[0], num_chunks)
+    corpus = centers[labels] + 0.5 * rng.standard_normal((num_chunks, dim)).astype(np.float32)
+    corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+
+    anchors = rng.integers(0, num_chunks, num_queries)
+    queries = corpus[anchors] + 0.3 * rng.standard_normal((num_queries, dim)).astype(np.float32) / np.sqrt(dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return corpus, queries
+
+
+def current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def directory_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 2**20
+
+
+def run_backend(backend: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    corpus, queries = make_dataset(args["chunks"], args["queries"], args["dim"], args["seed"])
+    k = args["k"]
+
+    # Exact top-k by cosine similarity is the recall reference
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :k]
+
+    persist_directory = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        embeddings = LookupEmbeddings(corpus, queries)
+        rss_before = current_rss_mb()
+        store = create_vector_store(backend, embeddings, persist_directory, dtype=args["dtype"])
+
+        build_start = time.perf_counter()
+        for start in range(0, len(corpus), args["batch_size"]):
+            indices = range(start, min(start + args["batch_size"], len(corpus)))
+            store.add_texts(
+                [f"chunk-{i}" for i in indices],
+                metadatas=[{"index": i} for i in indices],
+                ids=[f"chunk-{i}" for i in indices]
+            )
+        build_seconds = time.perf_counter() - build_start
+
+        # Warm up caches before timing
+        for j in range(min(5, len(queries))):
+            store.similarity_search(f"query-{j}", k=k)
+
+        latencies = []
+        recalls = []
+        for j in range(len(queries)):
+            start = time.perf_counter()
+            docs = store.similarity_search(f"query-{j}", k=k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            found = {doc.metadata["index"] for doc in docs}
+            recalls.append(len(found & set(truth[j].tolist())) / k)
+
+        latencies = np.array(latencies)
+        return {
+            "backend": backend,
+            "build_seconds": round(build_seconds, 2),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+            "latency_ms_p99": round(float(np.percentile(latencies, 99)), 3),
+            "queries_per_second": round(len(latencies) / (latencies.sum() / 1000), 1),
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "disk_mb": round(directory_size_mb(persist_directory), 1),
+        }
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector store backends")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"])
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = vars(parser.parse_args())
+
+    results = []
+    for backend in args["backends"]:
+        print(f"Running {backend} ({args['chunks']} chunks, dim {args['dim']})...")
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_backend, backend, args).result())
+
+    columns = list(results[0].keys())
+    print("\n" + " | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[column]) for column in columns))
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump({"config": args, "results": results}, f, indent=2)
+        print(f"\nResults written to {args['output']}")
+
+
+if __name__ == "__main__":
+    main()
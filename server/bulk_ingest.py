@@ -0,0 +1,217 @@
+"""
+Bulk-load a directory of course files into the RAG knowledge base.
+
+Files are parsed and split in a process pool, chunk embeddings are computed
+with bounded concurrency under a request-rate limit (filling the embedding
+cache), and each file is then written to the vector store in large batches.
+Completed files are recorded in a checkpoint so an interrupted run resumes
+where it stopped.
+
+Usage (from the server directory):
+    python bulk_ingest.py /path/to/faculty --workers 4 --embed-concurrency 4
+"""
+from typing import Dict, Any, List, Optional
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+server_dir = os.path.dirname(os.path.abspath(__file__))
+if server_dir not in sys.path:
+    sys.path.insert(0, server_dir)
+
+from services.document_loader import SUPPORTED_EXTENSIONS, load_and_split
+from services.logging_config import configure_logging
+from services.course_partitions import normalize_course_code, default_document_id
+
+
+class RateLimiter:
+    """Spaces out request starts to stay under a requests-per-minute budget."""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Checkpoint:
+    """JSON record of finished files, rewritten atomically after each one."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.completed = json.load(f).get("completed", {})
+
+    @staticmethod
+    def _signature(file_path: str) -> Dict[str, Any]:
+        stat = os.stat(file_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def is_done(self, key: str, file_path: str) -> bool:
+        entry = self.completed.get(key)
+        return bool(entry) and all(entry.get(k) == v for k, v in self._signature(file_path).items())
+
+    def mark_done(self, key: str, file_path: str, num_chunks: int):
+        self.completed[key] = {**self._signature(file_path), "chunks": num_chunks}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"completed": self.completed}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def discover_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(os.path.abspath(path))
+            continue
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                    files.append(os.path.abspath(os.path.join(root, name)))
+    return files
+
+
+def document_source(file_path: str, root: Optional[str]) -> str:
+    """The path relative to the ingestion root."""
+    return os.path.relpath(file_path, root) if root else os.path.basename(file_path)
+
+
+def document_key(file_path: str, root: Optional[str], course_code: Optional[str] = None) -> str:
+    """Stable document id and checkpoint key: the source path, under its course if any.
+
+    Keying by course keeps the same corpus ingested for two courses as two
+    documents, each with its own checkpoint entry.
+    """
+    return default_document_id(document_source(file_path, root), course_code)
+
+
+def embed_batches(rag, texts: List[str], batch_size: int, limiter: RateLimiter, pool: ThreadPoolExecutor) -> List:
+    """Embed the texts missing from the embedding cache, rate-limiting only those requests."""
+    def embed(batch: List[str]):
+        limiter.acquire()
+        rag.embeddings.embed_documents(batch)
+
+    missing = rag.embeddings.uncached(texts)
+    return [pool.submit(embed, missing[start:start + batch_size]) for start in range(0, len(missing), batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest course files into the RAG knowledge base")
+    parser.add_argument("paths", nargs="+", help="Files or directories to ingest")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="Parser processes")
+    parser.add_argument("--embed-concurrency", type=int, default=4, help="Concurrent embedding requests")
+    parser.add_argument("--embed-batch-size", type=int, default=256, help="Chunks per embedding request")
+    parser.add_argument("--requests-per-minute", type=float, default=3000, help="Embedding request rate limit (0 = none)")
+    parser.add_argument("--write-batch-size", type=int, default=1000, help="Chunks per vector store write")
+    parser.add_argument("--checkpoint", default="./data/bulk_ingest_checkpoint.json")
+    parser.add_argument("--max-inflight-files", type=int, default=8, help="Parsed files waiting for embedding")
+    parser.add_argument("--course-code", help="Course (CourseCode) whose partition receives every file")
+    args = parser.parse_args()
+
+    try:
+        course_code = normalize_course_code(args.course_code)
+    except ValueError as e:
+        parser.error(str(e))
+
+    configure_logging()
+    # Imported here so parser processes never build the RAG service
+    from services.ragService import rag_service
+
+    root = args.paths[0] if len(args.paths) == 1 and os.path.isdir(args.paths[0]) else None
+    checkpoint = Checkpoint(args.checkpoint)
+    files = discover_files(args.paths)
+    todo = [f for f in files if not checkpoint.is_done(document_key(f, root, course_code), f)]
+    print(f"Found {len(files)} files, {len(files) - len(todo)} already done, {len(todo)} to ingest")
+    if not todo:
+        return
+
+    limiter = RateLimiter(args.requests_per_minute)
+    misses_before = rag_service.embeddings.misses
+    stats = {"files": 0, "chunks": 0, "failed": 0}
+    started = time.monotonic()
+
+    def report(final: bool = False):
+        elapsed = max(time.monotonic() - started, 1e-9)
+        embeddings = rag_service.embeddings.misses - misses_before
+        print(
+            f"{'Done' if final else 'Progress'}: {stats['files']}/{len(todo)} files, {stats['chunks']} chunks, "
+            f"{embeddings} embeddings, {stats['failed']} failed in {elapsed:.1f}s | "
+            f"{stats['files'] / elapsed:.2f} files/s, {stats['chunks'] / elapsed:.1f} chunks/s, "
+            f"{embeddings / elapsed:.1f} embeddings/s"
+        )
+
+    def finish(file_path: str, chunks: List, embed_futures: List):
+        key = document_key(file_path, root, course_code)
+        try:
+            wait(embed_futures)
+            for future in embed_futures:
+                future.result()
+            result = rag_service.ingest_chunks(chunks, key, document_source(file_path, root),
+                                               batch_size=args.write_batch_size, course_code=course_code)
+            if result["status"] == "error":
+                raise RuntimeError(result["message"])
+            checkpoint.mark_done(key, file_path, len(chunks))
+            stats["files"] += 1
+            stats["chunks"] += len(chunks)
+        except Exception as e:
+            stats["failed"] += 1
+            print(f"Failed to ingest {key}: {str(e)}")
+        if (stats["files"] + stats["failed"]) % 10 == 0:
+            report()
+
+    inflight = deque()
+    remaining = iter(todo)
+    with ProcessPoolExecutor(max_workers=args.workers) as parsers, \
+            ThreadPoolExecutor(max_workers=args.embed_concurrency) as embedders:
+        # Parse only a little ahead of embedding, so parsed chunks never pile up
+        parsing = {}
+
+        def submit_next():
+            file_path = next(remaining, None)
+            if file_path is not None:
+                parsing[parsers.submit(load_and_split, file_path)] = file_path
+
+        for _ in range(args.workers + args.max_inflight_files):
+            submit_next()
+        while parsing:
+            done, _ = wait(parsing, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = parsing.pop(future)
+                submit_next()
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"Failed to parse {document_key(file_path, root, course_code)}: {str(e)}")
+                    continue
+
+                texts = [chunk.page_content for chunk in chunks]
+                inflight.append((file_path, chunks, embed_batches(rag_service, texts, args.embed_batch_size, limiter, embedders)))
+                # Write files in arrival order while later ones are still embedding
+                while len(inflight) > args.max_inflight_files:
+                    finish(*inflight.popleft())
+
+        while inflight:
+            finish(*inflight.popleft())
+
+    report(final=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,31 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Body
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from services.logging_config import configure_logging
+
+# Install the queued log handler before services log during import
+configure_logging()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from routes.rag import router as rag_router
+from fastapi.responses import Response
+from routes.rag import router as rag_router, sse_response, retrieval_options, condense_mode, course_code, chat_context
 from routes.learning_path import router as learning_path_router
 import os
-from dotenv import load_dotenv
 from services.ragService import rag_service
+from services.ingestion import ingestion_manager, IngestionQueueFullError, save_upload
 from services import service_manager
+from services.metrics import MetricsMiddleware, render_metrics
+from services.mongo_indexes import ensure_indexes
 from motor.motor_asyncio import AsyncIOMotorClient
-from typing import Dict, Any
-import traceback
+from typing import Dict, Any, Optional
+import logging
+import uuid
 import uvicorn
 
-# Load environment variables
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 # Check for required environment variables
 required_env_vars = ["OPENAI_API_KEY"]
@@ -27,6 +40,9 @@ MONGODB_URLS = [
     "mongodb://localhost:27017/online_learning_platform",  # Try localhost hostname
 ]
 
+# Create the indexes behind the hot queries at startup (idempotent)
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "true").lower() == "true"
+
 # Try each MongoDB URL until one works
 db_client = None
 last_error = None
@@ -35,7 +51,7 @@ for url in MONGODB_URLS:
     if not url:
         continue
     try:
-        print(f"Attempting to connect to MongoDB at: {url}")
+        logger.info("Attempting to connect to MongoDB at: %s", url)
         db_client = AsyncIOMotorClient(
             url,
             serverSelectionTimeoutMS=30000,  # Increased timeout
@@ -53,7 +69,7 @@ for url in MONGODB_URLS:
         break
     except Exception as e:
         last_error = e
-        print(f"Failed to connect to {url}: {str(e)}")
+        logger.warning("Failed to connect to %s: %s", url, e)
         if db_client:
             db_client.close()
             db_client = None
@@ -78,11 +94,14 @@ app.add_middleware(
     max_age=3600
 )
 
+# Per-request latency, and the endpoint label for per-stage timings
+app.add_middleware(MetricsMiddleware)
+
 # Initialize services with proper error handling
 try:
     service_manager.init_services(db_client)
 except Exception as e:
-    print(f"Error initializing services: {e}")
+    logger.exception("Error initializing services: %s", e)
     raise
 
 # Remove the /api prefix from the router as it's already in the route paths
@@ -94,48 +113,68 @@ app.include_router(learning_path_router)
 async def health_check():
     return {"status": "ok", "message": "API is running"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.on_event("startup")
 async def startup_db_client():
     try:
         # Verify database connection
-        print("Testing database connection...")
+        logger.info("Testing database connection...")
         await db_client.admin.command('ping')
-        print("Successfully connected to MongoDB")
+        logger.info("Successfully connected to MongoDB")
+
+        if MONGO_ENSURE_INDEXES:
+            try:
+                await ensure_indexes(db_client.get_default_database())
+            except Exception as e:
+                # Missing privileges should not keep the API down; queries still work, only slower
+                logger.warning("Could not create MongoDB indexes: %s", e)
+
+        if service_manager.course_catalog:
+            await service_manager.course_catalog.start()
         
         # Print available databases and collections for debugging
-        print("Fetching database information...")
+        logger.info("Fetching database information...")
         database_names = await db_client.list_database_names()
-        print(f"Available databases: {database_names}")
+        logger.info("Available databases: %s", database_names)
         
         db = db_client.get_default_database()
-        print(f"Selected database: {db.name}")
+        logger.info("Selected database: %s", db.name)
         collection_names = await db.list_collection_names()
-        print(f"Collections in database: {collection_names}")
+        logger.info("Collections in database: %s", collection_names)
 
         # Test specific collection access
-        print("Testing collection access...")
+        logger.info("Testing collection access...")
         user_count = await db.User.count_documents({})
-        print(f"Found {user_count} users in database")
+        logger.info("Found %d users in database", user_count)
         
-        print("Services initialized successfully")
+        logger.info("Services initialized successfully")
 
     except Exception as e:
-        print(f"Failed to initialize application: {str(e)}")
-        print(f"Full error traceback:\n{traceback.format_exc()}")
+        logger.exception("Failed to initialize application: %s", e)
         raise e
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    ingestion_manager.executor.shutdown(wait=False)
+    if service_manager.course_catalog:
+        await service_manager.course_catalog.stop()
     if db_client:
         db_client.close()
-        print("MongoDB connection closed")
+        logger.info("MongoDB connection closed")
 
 # Ensure upload directory exists
 UPLOAD_DIR = "./uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@app.post("/rag/upload")
-async def upload_document(file: UploadFile = File(...)):
+@app.post("/rag/upload", status_code=202)
+async def upload_document(file: UploadFile = File(...), document_id: Optional[str] = Form(None),
+                          course: Optional[str] = Form(None, alias="course_code")):
+    code = course_code(course)
     try:
         # Validate file type
         allowed_extensions = ['.txt', '.pdf', '.doc', '.docx']
@@ -147,38 +186,49 @@ async def upload_document(file: UploadFile = File(...)):
                 detail=f"File type not supported. Allowed types: {', '.join(allowed_extensions)}"
             )
 
-        # Save file temporarily
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
+        # Save file under a unique name; the ingestion job removes it when done
+        file_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{os.path.basename(file.filename)}")
+        with open(file_path, "wb") as buffer:
+            await save_upload(file, buffer)
+
+        # Queue the document for background ingestion
         try:
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
-            # Process document with RAG
-            result = await rag_service.add_document(file_path)
-            
-            if result["status"] == "error":
-                raise HTTPException(status_code=500, detail=result["message"])
-            
-            return result
-        finally:
-            # Clean up temporary file
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                
+            job = ingestion_manager.submit(file_path, file.filename, document_id=document_id, course_code=code)
+        except IngestionQueueFullError as e:
+            os.remove(file_path)
+            raise HTTPException(status_code=503, detail=str(e))
+
+        return {
+            "status": "accepted",
+            "job_id": job.id,
+            "job": job.to_dict()
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/rag/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    job = ingestion_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Ingestion job not found: {job_id}")
+    return {"status": "success", "job": job.to_dict()}
+
 @app.post("/rag/query")
 async def query(request: Dict[str, Any] = Body(...)):
+    retrieval = retrieval_options(request.get("retrieval"))
+    mode = condense_mode(request.get("condense_mode"))
+    code = course_code(request.get("course_code"))
+    context = chat_context(request.get("context"))
     try:
         question = request.get("question")
-        context = request.get("context")
         
         if not question:
             raise HTTPException(status_code=400, detail="Question is required")
             
-        result = await rag_service.query(question, context)
+        result = await rag_service.query(question, context, session_id=request.get("session_id"),
+                                         retrieval=retrieval, condense_mode=mode, course_code=code)
         
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
@@ -187,14 +237,30 @@ async def query(request: Dict[str, Any] = Body(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/rag/query/stream")
+async def query_stream(request: Dict[str, Any] = Body(...)):
+    question = request.get("question")
+
+    if not question:
+        raise HTTPException(status_code=400, detail="Question is required")
+    retrieval = retrieval_options(request.get("retrieval"))
+    mode = condense_mode(request.get("condense_mode"))
+    code = course_code(request.get("course_code"))
+    context = chat_context(request.get("context"))
+
+    return sse_response(rag_service.stream_query(question, context, session_id=request.get("session_id"),
+                                                 retrieval=retrieval, condense_mode=mode, course_code=code))
+
 @app.post("/rag/context")
 async def get_context(request: Dict[str, Any] = Body(...)):
+    retrieval = retrieval_options(request.get("retrieval"))
+    code = course_code(request.get("course_code"))
     try:
         query = request.get("query")
         if not query:
             raise HTTPException(status_code=400, detail="Query is required")
             
-        result = await rag_service.get_relevant_context(query)
+        result = await rag_service.get_relevant_context(query, retrieval, course_code=code)
         
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
@@ -0,0 +1,69 @@
+"""
+Create the MongoDB indexes the learning-path queries rely on, or verify them.
+
+Index creation is idempotent, so it is safe to run on every deploy (the
+server also runs it at startup). With --check, each hot query is explained
+and the command exits with status 1 if any of them would scan a whole
+collection.
+
+Usage (from the server directory):
+    python manage_indexes.py                # create missing indexes
+    python manage_indexes.py --check        # create, then verify query plans
+    python manage_indexes.py --check-only   # verify without creating anything
+"""
+import os
+import sys
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+server_dir = os.path.dirname(os.path.abspath(__file__))
+if server_dir not in sys.path:
+    sys.path.insert(0, server_dir)
+
+from services.logging_config import configure_logging
+from services.mongo_indexes import ensure_indexes, check_query_plans
+
+
+async def run(args: argparse.Namespace) -> int:
+    client = AsyncIOMotorClient(args.url, serverSelectionTimeoutMS=30000)
+    try:
+        db = client.get_default_database()
+        if not args.check_only:
+            for collection, names in (await ensure_indexes(db)).items():
+                print(f"{collection}: {', '.join(names)}")
+        if not (args.check or args.check_only):
+            return 0
+
+        failed = 0
+        for result in await check_query_plans(db):
+            status = "COLLSCAN" if result["collection_scan"] else "ok"
+            print(f"{status:>8}  {result['query']} ({result['collection']}): {' > '.join(result['stages'])}")
+            failed += result["collection_scan"]
+        if failed:
+            print(f"{failed} hot queries scan a whole collection")
+            return 1
+        print("All hot queries use an index")
+        return 0
+    finally:
+        client.close()
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Create and verify MongoDB indexes for the hot queries")
+    parser.add_argument("--url", default=os.getenv("MONGODB_URL"), help="MongoDB URL (default: $MONGODB_URL)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--check", action="store_true", help="Also explain the hot queries; fail on a collection scan")
+    mode.add_argument("--check-only", action="store_true", help="Only explain the hot queries, create nothing")
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("No MongoDB URL: pass --url or set MONGODB_URL")
+
+    configure_logging()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,34 @@
 from fastapi import APIRouter, HTTPException, Request
 from typing import Dict, Any
-import traceback
+import logging
 from services import service_manager
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/learning-path", tags=["learning-path"])
 
 @router.get("/debug/user/{user_code}")
 async def debug_user_info(request: Request, user_code: str) -> Dict[str, Any]:
     """Debug endpoint to check user existence and details"""
     try:
-        print(f"\n=== Debug User Info Request ===")
-        print(f"URL: {request.url}")
-        print(f"Method: {request.method}")
-        print(f"Headers: {request.headers}")
-        print(f"User code: {user_code}")
+        logger.debug("Debug user info request: %s %s (user code %s)", request.method, request.url, user_code)
         
         # Get user from database
         db = service_manager.learning_path_service.db
-        print(f"Database: {db.name}")
         
         # Try both fields
-        print("Searching with UserCode...")
         user = await db.User.find_one({"UserCode": user_code})
-        print(f"Result with UserCode: {user}")
         
         if not user:
-            print("Searching with userId...")
             user = await db.User.find_one({"userId": user_code})
-            print(f"Result with userId: {user}")
             
         if not user:
             # List all users for debugging
-            print("User not found, listing all users...")
-            all_users = await db.User.find().to_list(length=None)
+            all_users = await db.User.find(
+                {}, {"userId": 1, "UserCode": 1, "Name": 1}
+            ).to_list(length=None)
             user_list = [{"userId": u.get("userId"), "UserCode": u.get("UserCode"), "Name": u.get("Name")} for u in all_users]
-            print(f"All users: {user_list}")
+            logger.debug("User %s not found among %d users", user_code, len(user_list))
             return {
                 "status": "error",
                 "message": f"User not found: {user_code}",
@@ -42,14 +36,12 @@ async def debug_user_info(request: Request, user_code: str) -> Dict[str, Any]:
             }
             
         # Get progress records
-        print("Getting progress records...")
         progress = await db.UserProgress.find({
             "$or": [
                 {"userCode": user_code},
                 {"userId": user_code}
             ]
         }).to_list(length=None)
-        print(f"Found {len(progress) if progress else 0} progress records")
         
         result = {
             "status": "success",
@@ -60,12 +52,11 @@ async def debug_user_info(request: Request, user_code: str) -> Dict[str, Any]:
             },
             "progress_count": len(progress) if progress else 0
         }
-        print(f"Returning result: {result}")
+        logger.debug("Debug user info result: %s", result)
         return result
         
     except Exception as e:
-        print(f"Error in debug_user_info: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in debug_user_info: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error checking user info: {str(e)}"
@@ -79,8 +70,7 @@ async def get_learning_path_advice(user_code: str) -> Dict[str, Any]:
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(f"Error in get_learning_path_advice: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in get_learning_path_advice: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate learning path advice: {str(e)}"
@@ -104,9 +94,17 @@ async def get_course_recommendations(user_code: str) -> Dict[str, Any]:
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
-        print(f"Error in get_course_recommendations: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Error in get_course_recommendations: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to get course recommendations: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/stats")
+async def get_learning_path_stats() -> Dict[str, Any]:
+    catalog = service_manager.course_catalog
+    return {
+        "status": "success",
+        "ai_advisor": service_manager.ai_advisor_service.get_stats(),
+        "course_catalog": catalog.get_stats() if catalog else None
+    }
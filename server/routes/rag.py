@@ -1,9 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body
-from typing import Dict, Any
-import shutil
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Body, Query
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, AsyncIterator, Optional, Tuple
+import json
 import os
+import logging
 from tempfile import NamedTemporaryFile
-from services.ragService import rag_service
+from services.ragService import rag_service, parse_retrieval_options, parse_chat_history, CONDENSE_MODES
+from services.course_partitions import normalize_course_code
+from services.ingestion import ingestion_manager, IngestionQueueFullError, save_upload
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/rag",
@@ -11,59 +17,173 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.post("/upload")
-async def upload_document(file: UploadFile = File(...)) -> Dict[str, Any]:
+def sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    """Wrap an async iterator of (event, data) pairs as a Server-Sent Events response."""
+    async def event_stream():
+        async for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def retrieval_options(options: Any) -> Dict[str, Any]:
+    """Validate per-request retrieval overrides, rejecting bad values with a 400."""
+    try:
+        return parse_retrieval_options(options)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def condense_mode(value: Any) -> Optional[str]:
+    """Validate a per-request condense mode; None keeps the configured default."""
+    if value is not None and value not in CONDENSE_MODES:
+        raise HTTPException(status_code=400, detail=f"condense_mode must be one of: {', '.join(CONDENSE_MODES)}")
+    return value
+
+def chat_context(value: Any) -> Dict[str, Any]:
+    """Validate a request context and its chat_history, rejecting unknown shapes with a 400."""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise HTTPException(status_code=400, detail="context must be an object")
+    try:
+        return {**value, "chat_history": parse_chat_history(value.get("chat_history"))}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def course_code(value: Any) -> Optional[str]:
+    """Validate a course code (Mongo `CourseCode`); None means no course."""
+    try:
+        return normalize_course_code(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/upload", status_code=202)
+async def upload_document(file: UploadFile = File(...), document_id: Optional[str] = Form(None),
+                          course: Optional[str] = Form(None, alias="course_code")) -> Dict[str, Any]:
+    code = course_code(course)
     try:
-        # Save uploaded file to temporary location
+        # Save uploaded file to temporary location; the ingestion job removes it when done
         with NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
+            await save_upload(file, temp_file)
             temp_path = temp_file.name
 
-        # Process the document
-        result = await rag_service.add_document(temp_path)
-        
-        # Clean up temporary file
-        os.unlink(temp_path)
-        
-        if result["status"] == "error":
-            raise HTTPException(status_code=400, detail=result["message"])
-            
-        return result
+        # Queue the document for background ingestion
+        try:
+            job = ingestion_manager.submit(temp_path, file.filename, document_id=document_id, course_code=code)
+        except IngestionQueueFullError as e:
+            os.unlink(temp_path)
+            raise HTTPException(status_code=503, detail=str(e))
+
+        return {
+            "status": "accepted",
+            "job_id": job.id,
+            "job": job.to_dict()
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/documents")
+async def list_documents(course: Optional[str] = Query(None, alias="course_code")) -> Dict[str, Any]:
+    return {"status": "success", "documents": rag_service.registry.list_documents(course_code(course))}
+
+@router.delete("/documents/{document_id:path}")
+async def delete_document(document_id: str) -> Dict[str, Any]:
+    result = await rag_service.delete_document(document_id)
+    if result["status"] == "error":
+        raise HTTPException(status_code=404, detail=result["message"])
+    return result
+
+@router.get("/jobs")
+async def list_ingestion_jobs() -> Dict[str, Any]:
+    return {"status": "success", "jobs": ingestion_manager.list_jobs()}
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str) -> Dict[str, Any]:
+    job = ingestion_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Ingestion job not found: {job_id}")
+    return {"status": "success", "job": job.to_dict()}
+
 @router.post("/query")
 async def query_rag(request_data: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
+    retrieval = retrieval_options(request_data.get("retrieval"))
+    mode = condense_mode(request_data.get("condense_mode"))
+    code = course_code(request_data.get("course_code"))
+    context = chat_context(request_data.get("context"))
     try:
-        print(f"Request data: {request_data}")
+        logger.debug("Query request: %s", request_data)
         message = request_data.get("message")
-        context = request_data.get("context", {})
         
         if not message:
             raise HTTPException(status_code=400, detail="Message is required")
             
-        result = await rag_service.query(message=message, context=context)
+        result = await rag_service.query(
+            message=message,
+            context=context,
+            session_id=request_data.get("session_id"),
+            retrieval=retrieval,
+            condense_mode=mode,
+            course_code=code
+        )
         
         if result["status"] == "error":
             raise HTTPException(status_code=500, detail=result["message"])
             
         return result
     except Exception as e:
-        print(f"Error in query endpoint: {str(e)}")
-        print(f"Request data: {request_data}")
+        logger.error("Error in query endpoint: %s (request: %s)", e, request_data)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.post("/query/stream")
+async def query_rag_stream(request_data: Dict[str, Any] = Body(...)) -> StreamingResponse:
+    message = request_data.get("message")
+
+    if not message:
+        raise HTTPException(status_code=400, detail="Message is required")
+    retrieval = retrieval_options(request_data.get("retrieval"))
+    mode = condense_mode(request_data.get("condense_mode"))
+    code = course_code(request_data.get("course_code"))
+    context = chat_context(request_data.get("context"))
+
+    return sse_response(rag_service.stream_query(
+        message=message,
+        context=context,
+        session_id=request_data.get("session_id"),
+        retrieval=retrieval,
+        condense_mode=mode,
+        course_code=code
+    ))
+
+@router.delete("/sessions/{session_id}")
+async def clear_session(session_id: str) -> Dict[str, Any]:
+    if not rag_service.sessions.clear(session_id):
+        raise HTTPException(status_code=404, detail=f"Session not found: {session_id}")
+    return {"status": "success", "message": f"Cleared session: {session_id}"}
+
 @router.get("/context")
-async def get_context(query: str) -> Dict[str, Any]:
+async def get_context(query: str, k: Optional[int] = None, fetch_k: Optional[int] = None,
+                      mmr_lambda: Optional[float] = None, rerank: Optional[bool] = None,
+                      course: Optional[str] = Query(None, alias="course_code")) -> Dict[str, Any]:
+    retrieval = retrieval_options({"k": k, "fetch_k": fetch_k, "mmr_lambda": mmr_lambda, "rerank": rerank})
+    code = course_code(course)
     try:
         if not query:
             raise HTTPException(status_code=400, detail="Query parameter is required")
             
-        result = await rag_service.get_relevant_context(query)
+        result = await rag_service.get_relevant_context(query, retrieval, course_code=code)
         
         if result["status"] == "error":
             raise HTTPException(status_code=400, detail=result["message"])
             
         return result
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stats")
+async def get_stats() -> Dict[str, Any]:
+    return {"status": "success", "stats": rag_service.get_stats()}
@@ -6,11 +6,13 @@ from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from .learning_path import LearningPathService
 from .ai_advisor import AIAdvisorService
+from .course_catalog import CourseCatalog, CATALOG_ENABLED
 
 class ServiceManager:
     _instance = None
     learning_path_service: Optional[LearningPathService] = None
     ai_advisor_service: Optional[AIAdvisorService] = None
+    course_catalog: Optional[CourseCatalog] = None
 
     @classmethod
     def get_instance(cls):
@@ -20,7 +22,9 @@ class ServiceManager:
 
     def init_services(self, db_client: AsyncIOMotorClient):
         """Initialize all services with the database client"""
-        self.learning_path_service = LearningPathService(db_client)
+        if CATALOG_ENABLED:
+            self.course_catalog = CourseCatalog(db_client.get_default_database())
+        self.learning_path_service = LearningPathService(db_client, catalog=self.course_catalog)
         self.ai_advisor_service = AIAdvisorService()
 
 service_manager = ServiceManager.get_instance() 
\ No newline at end of file
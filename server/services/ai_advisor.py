@@ -1,10 +1,20 @@
 from typing import Dict, Any
 import os
-from openai import OpenAI
+import logging
+from openai import AsyncOpenAI
+from services.metrics import track_stage
+from services.single_flight import SingleFlight, flight_key, normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+ADVISOR_MODEL = "gpt-4-turbo-preview"
 
 class AIAdvisorService:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Async client so the call does not block the event loop (and concurrent
+        # identical requests can actually overlap and be collapsed)
+        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.advice_flight = SingleFlight("ai_advisor")
 
     async def generate_advice(self, user_data: Dict[str, Any]) -> str:
         """Generate personalized learning advice using GPT-4"""
@@ -42,9 +52,20 @@ Lời khuyên cần:
 - Giọng điệu thân thiện, động viên
 """
 
-            # Call GPT-4
-            response = self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
+            # Call GPT-4; identical prompts in flight at the same time share one call
+            return await self.advice_flight.do(
+                flight_key(ADVISOR_MODEL, normalize_prompt(context)),
+                lambda: self._complete(context)
+            )
+
+        except Exception as e:
+            logger.error("Error generating AI advice: %s", e)
+            return self._get_fallback_advice(user_data)
+
+    async def _complete(self, context: str) -> str:
+        with track_stage("ai_advisor"):
+            response = await self.client.chat.completions.create(
+                model=ADVISOR_MODEL,
                 messages=[
                     {"role": "system", "content": "Bạn là một cố vấn học tập chuyên nghiệp với nhiều năm kinh nghiệm trong việc hướng dẫn và tư vấn cho học viên online."},
                     {"role": "user", "content": context}
@@ -52,12 +73,10 @@ Lời khuyên cần:
                 temperature=0.7,
                 max_tokens=2000
             )
+        return response.choices[0].message.content
 
-            return response.choices[0].message.content
-
-        except Exception as e:
-            print(f"Error generating AI advice: {str(e)}")
-            return self._get_fallback_advice(user_data)
+    def get_stats(self) -> Dict[str, Any]:
+        return {"single_flight": self.advice_flight.get_stats()}
 
     def _format_in_progress_courses(self, courses: list) -> str:
         """Format in-progress courses for the prompt"""
@@ -0,0 +1,136 @@
+from typing import Dict, Any, List, Optional, Tuple
+import time
+import threading
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """In-memory cache of answers keyed by question embedding.
+
+    A lookup returns the stored answer of the most similar cached question
+    when its cosine similarity reaches `threshold`. Entries expire after
+    `ttl_seconds`; once `max_entries` is reached the least recently used
+    entry is replaced. All lookups are a single matrix-vector product.
+
+    Entries belong to a scope (the course a question was asked in, None for
+    unscoped questions); lookups only match their own scope, and a scope can
+    be invalidated without dropping the others.
+
+    Each invalidation bumps the scope's generation. A caller reads
+    generation() before retrieving and passes it to store(); an answer built
+    from documents that changed meanwhile is then not stored.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+        self._lock = threading.Lock()
+        # invalidate() bumps the epoch, invalidate_scope() the scope's own counter
+        self._epoch = 0
+        self._generations: Dict[Optional[str], int] = {}
+        self._reset()
+
+    def _reset(self):
+        self._vectors: Optional[np.ndarray] = None  # allocated on first store, once the dimension is known
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._created = np.zeros(self.max_entries)
+        self._last_access = np.zeros(self.max_entries)
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._scopes = np.full(self.max_entries, None, dtype=object)
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: List[float], scope: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for the closest question in the scope, or None on a miss."""
+        query = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._vectors is not None:
+                self._valid &= (now - self._created) < self.ttl_seconds
+            candidates = self._valid & (self._scopes == scope)
+            if self._vectors is None or not candidates.any():
+                self.misses += 1
+                return None
+
+            similarities = np.where(candidates, self._vectors @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._last_access[best] = now
+            entry = self._entries[best]
+            return {**entry, "similarity": float(similarities[best])}
+
+    def generation(self, scope: Optional[str] = None) -> Tuple[int, int]:
+        """The scope's current generation, to pass to store()."""
+        with self._lock:
+            return self._epoch, self._generations.get(scope, 0)
+
+    def store(self, question: str, vector: List[float], answer: str, sources: List[Dict[str, Any]],
+              scope: Optional[str] = None, generation: Optional[Tuple[int, int]] = None) -> bool:
+        """Cache an answer; returns False if the scope was invalidated since `generation`."""
+        normalized = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(scope, 0)):
+                self.stale_stores += 1
+                return False
+            if self._vectors is None or self._vectors.shape[1] != normalized.shape[0]:
+                self._reset()
+                self._vectors = np.zeros((self.max_entries, normalized.shape[0]), dtype=np.float32)
+
+            # Fill a free slot, otherwise replace the least recently used entry
+            free = np.flatnonzero(~self._valid)
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_access))
+
+            self._vectors[slot] = normalized
+            self._entries[slot] = {"question": question, "answer": answer, "sources": sources}
+            self._created[slot] = now
+            self._last_access[slot] = now
+            self._valid[slot] = True
+            self._scopes[slot] = scope
+        return True
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the document corpus changed."""
+        with self._lock:
+            self._valid[:] = False
+            self._entries = [None] * self.max_entries
+            self._epoch += 1
+            self.invalidations += 1
+
+    def invalidate_scope(self, scope: Optional[str]):
+        """Drop the cached answers of one scope, e.g. after a course's documents changed."""
+        with self._lock:
+            stale = np.flatnonzero(self._valid & (self._scopes == scope))
+            self._valid[stale] = False
+            for slot in stale:
+                self._entries[slot] = None
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+            self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": int(self._valid.sum()),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "invalidations": self.invalidations,
+                "stale_stores": self.stale_stores
+            }
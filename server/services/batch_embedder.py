@@ -0,0 +1,119 @@
+from typing import Dict, Any, List, Optional
+import time
+import threading
+from langchain_core.embeddings import Embeddings
+from services.metrics import track_stage, record_items
+
+# Upper bounds of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64]
+
+
+class _PendingQuery:
+    def __init__(self, text: str):
+        self.text = text
+        self.taken = False
+        self.done = False
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[BaseException] = None
+
+
+class CoalescingEmbeddings(Embeddings):
+    """Coalesces concurrent query embeddings into batched API calls.
+
+    The first caller to arrive becomes the batch leader: it waits up to
+    `window_ms` (or until `max_batch_size` queries are pending), sends all
+    pending queries in one `embed_documents` call and hands every caller its
+    vector. Document embeddings are passed straight through.
+    """
+
+    def __init__(self, underlying: Embeddings, window_ms: float = 5, max_batch_size: int = 32):
+        self.underlying = underlying
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: List[_PendingQuery] = []
+        self._leader_active = False
+        self._cond = threading.Condition()
+
+        self.batches = 0
+        self.queries = 0
+        self.max_observed_batch = 0
+        self.histogram = {bucket: 0 for bucket in BATCH_SIZE_BUCKETS}
+        self.histogram["+Inf"] = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        request = _PendingQuery(text)
+        with self._cond:
+            self._pending.append(request)
+            if len(self._pending) >= self.max_batch_size:
+                self._cond.notify_all()
+
+            while not request.done:
+                if request.taken or self._leader_active:
+                    self._cond.wait()
+                    continue
+
+                # Lead the next batch: collect queries until the window closes or it is full
+                self._leader_active = True
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[:self.max_batch_size]
+                del self._pending[:self.max_batch_size]
+                for pending in batch:
+                    pending.taken = True
+                self._leader_active = False
+                # Leftover queries can elect a new leader while this batch is in flight
+                self._cond.notify_all()
+
+                self._cond.release()
+                try:
+                    self._run_batch(batch)
+                finally:
+                    self._cond.acquire()
+                    self._cond.notify_all()
+
+        if request.error is not None:
+            raise request.error
+        return request.vector
+
+    def _run_batch(self, batch: List[_PendingQuery]):
+        try:
+            with track_stage("embed_query"):
+                vectors = self.underlying.embed_documents([pending.text for pending in batch])
+            record_items("embed_query", len(batch))
+            for pending, vector in zip(batch, vectors):
+                pending.vector = vector
+        except BaseException as e:
+            for pending in batch:
+                pending.error = e
+        finally:
+            for pending in batch:
+                pending.done = True
+            self._record(len(batch))
+
+    def _record(self, size: int):
+        with self._cond:
+            self.batches += 1
+            self.queries += size
+            self.max_observed_batch = max(self.max_observed_batch, size)
+            bucket = next((b for b in BATCH_SIZE_BUCKETS if size <= b), "+Inf")
+            self.histogram[bucket] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+                "queries": self.queries,
+                "batches": self.batches,
+                "mean_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+                "max_observed_batch": self.max_observed_batch,
+                "batch_size_histogram": {f"le_{bucket}": count for bucket, count in self.histogram.items()}
+            }
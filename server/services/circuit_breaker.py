@@ -0,0 +1,225 @@
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+import httpx
+import openai
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from services.metrics import CIRCUIT_CALLS, CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+def is_dependency_failure(error: BaseException) -> bool:
+    """Whether an error says the dependency is unhealthy, rather than the request is bad.
+
+    Timeouts, connection and transport errors (OpenAI, Chroma over HTTP),
+    OpenAI 5xx responses, rate limiting and rejected credentials count.
+    Caller errors such as a ValueError or an OpenAI 400 do not.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in (401, 403, 408, 429)
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError,
+                              openai.APIError, httpx.TransportError))
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with a timeout derived from observed latency.
+
+    Closed: calls go through and the outcomes of the last `window` calls are
+    kept; once `min_calls` are recorded and the failure rate reaches
+    `failure_rate`, the circuit opens. Open: calls fail immediately with
+    CircuitOpenError for `open_seconds`. Half-open: a single trial call is
+    let through; its success closes the circuit, its failure re-opens it.
+
+    timeout() is `timeout_multiplier` times the given percentile of recent
+    successful latencies, clamped to [min_timeout, max_timeout]; until
+    `min_calls` successes are seen it is max_timeout.
+
+    Only errors for which `is_failure` holds count as failures; others pass
+    through without affecting the circuit, so bad requests cannot open it.
+    """
+
+    def __init__(self, name: str, failure_rate: float = 0.5, min_calls: int = 5, window: int = 20,
+                 open_seconds: float = 30.0, min_timeout: float = 1.0, max_timeout: float = 60.0,
+                 timeout_percentile: float = 99.0, timeout_multiplier: float = 2.0, latency_samples: int = 200,
+                 is_failure: Callable[[BaseException], bool] = is_dependency_failure):
+        self.name = name
+        self.is_failure = is_failure
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_percentile = timeout_percentile
+        self.timeout_multiplier = timeout_multiplier
+
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque(maxlen=window)  # True for a failure
+        self._latencies: deque = deque(maxlen=latency_samples)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.times_opened = 0
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str):
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def _open(self):
+        self._set_state(OPEN)
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+        self.times_opened += 1
+        logger.warning("Circuit %s opened; failing fast for %.0fs", self.name, self.open_seconds)
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may go through now."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+            if self._state == OPEN or (self._state == HALF_OPEN and self._trial_in_flight):
+                self.rejected += 1
+                CIRCUIT_CALLS.labels(self.name, "rejected").inc()
+                raise CircuitOpenError(f"Circuit {self.name} is open")
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = True
+
+    def record_success(self, seconds: Optional[float] = None):
+        with self._lock:
+            self.successes += 1
+            self._outcomes.append(False)
+            if seconds is not None:
+                self._latencies.append(seconds)
+            if self._state == HALF_OPEN:
+                self._outcomes.clear()
+                self._trial_in_flight = False
+                self._set_state(CLOSED)
+                logger.info("Circuit %s closed", self.name)
+        CIRCUIT_CALLS.labels(self.name, "success").inc()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._outcomes.append(True)
+            if self._state == HALF_OPEN:
+                self._open()
+            elif self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                if sum(self._outcomes) / len(self._outcomes) >= self.failure_rate:
+                    self._open()
+        CIRCUIT_CALLS.labels(self.name, "failure").inc()
+
+    def _release(self):
+        """Forget a call that ended without telling anything about the dependency."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def timeout(self) -> float:
+        with self._lock:
+            samples = list(self._latencies)
+        if len(samples) < self.min_calls:
+            return self.max_timeout
+        observed = float(np.percentile(samples, self.timeout_percentile)) * self.timeout_multiplier
+        return min(max(observed, self.min_timeout), self.max_timeout)
+
+    @contextmanager
+    def track(self, sample_latency: bool = True):
+        """Guard the enclosed call: fail fast when open, record its outcome otherwise.
+
+        A CircuitOpenError from a nested dependency, a cancellation or an
+        error that is_failure rejects is not counted against this one.
+        """
+        self.allow()
+        start = time.perf_counter()
+        try:
+            yield
+        except CircuitOpenError:
+            self._release()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure()
+            else:
+                self._release()
+            raise
+        except BaseException:
+            self._release()
+            raise
+        self.record_success(time.perf_counter() - start if sample_latency else None)
+
+    def call(self, func: Callable[..., T], *args: Any, sample_latency: bool = True) -> T:
+        with self.track(sample_latency):
+            return func(*args)
+
+    async def call_async(self, func: Callable[[], Awaitable[T]]) -> T:
+        """Await func() under the breaker, giving up after the adaptive timeout."""
+        with self.track():
+            return await asyncio.wait_for(func(), timeout=self.timeout())
+
+    async def stream_async(self, stream: AsyncIterable[T]) -> AsyncIterator[T]:
+        """Iterate stream under the breaker, giving up when the first item or
+        the gap between two items takes longer than the adaptive timeout."""
+        timeout = self.timeout()
+        iterator = stream.__aiter__()
+        try:
+            with self.track():
+                while True:
+                    try:
+                        item = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield item
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            outcomes = list(self._outcomes)
+            state = self._state
+        return {
+            "state": state,
+            "recent_failure_rate": round(sum(outcomes) / len(outcomes), 4) if outcomes else 0.0,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+            "timeout_seconds": round(self.timeout(), 3),
+        }
+
+
+class GuardedEmbeddings(Embeddings):
+    """Embeddings behind a circuit breaker, so a failing API is not called per request.
+
+    Only query latencies feed the adaptive timeout; document batches vary
+    too much in size.
+    """
+
+    def __init__(self, underlying: Embeddings, breaker: CircuitBreaker):
+        self.underlying = underlying
+        self.breaker = breaker
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.breaker.call(self.underlying.embed_documents, texts, sample_latency=False)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.breaker.call(self.underlying.embed_query, text)
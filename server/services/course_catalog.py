@@ -0,0 +1,129 @@
+from typing import Any, Dict, List, Optional
+import os
+import time
+import asyncio
+import logging
+from services.metrics import track_stage
+
+logger = logging.getLogger(__name__)
+
+# Serve recommendations from memory only while the catalog snapshot is at most
+# this old; it is reloaded every half of this, and right away on change events
+CATALOG_MAX_STALENESS_SECONDS = float(os.getenv("COURSE_CATALOG_MAX_STALENESS_SECONDS", "60"))
+# Set to "false" to send every recommendation query to MongoDB
+CATALOG_ENABLED = os.getenv("COURSE_CATALOG_ENABLED", "true").lower() == "true"
+
+
+class CatalogSnapshot:
+    """Immutable view of the active courses with category and skill tag indexes.
+
+    Courses keep the order MongoDB returned them in, and the indexes map to
+    positions in that list; equally scored recommendations keep that order.
+    """
+
+    def __init__(self, courses: List[Dict[str, Any]]):
+        self.courses = courses
+        self.loaded_at = time.monotonic()
+        self.by_category: Dict[Any, List[int]] = {}
+        self.by_skill: Dict[Any, List[int]] = {}
+        for position, course in enumerate(courses):
+            if course.get("category") is not None:
+                self.by_category.setdefault(course["category"], []).append(position)
+            for skill in course.get("skillTags") or []:
+                self.by_skill.setdefault(skill, []).append(position)
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded_at
+
+
+class CourseCatalog:
+    """In-process snapshot of the active courses for recommendations.
+
+    A background task reloads it every max_staleness_seconds / 2. Where
+    MongoDB supports change streams (replica sets, Atlas), a change to the
+    Course collection triggers a reload right away. If the snapshot is
+    missing or older than the bound, snapshot() returns None and callers
+    query MongoDB instead.
+    """
+
+    def __init__(self, db, max_staleness_seconds: float = CATALOG_MAX_STALENESS_SECONDS):
+        self.db = db
+        self.max_staleness_seconds = max_staleness_seconds
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.change_stream = False
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._changed = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def refresh(self):
+        with track_stage("catalog_refresh"):
+            courses = await self.db.Course.find({"Status": "Active"}).to_list(length=None)
+        # Swapped in one assignment; readers never see a half-built snapshot
+        self._snapshot = CatalogSnapshot(courses)
+        self.refreshes += 1
+        logger.debug("Course catalog reloaded: %d active courses", len(courses))
+
+    async def start(self):
+        """Load the catalog, then keep it fresh in the background."""
+        try:
+            await self.refresh()
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning("Could not load the course catalog, recommendations use MongoDB: %s", e)
+        self._tasks = [asyncio.create_task(self._refresh_loop()), asyncio.create_task(self._watch_changes())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.max_staleness_seconds / 2)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.warning("Course catalog refresh failed: %s", e)
+
+    async def _watch_changes(self):
+        try:
+            async with self.db.Course.watch() as stream:
+                self.change_stream = True
+                logger.info("Watching the Course collection for catalog changes")
+                async for _ in stream:
+                    self._changed.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Standalone servers have no change streams; the periodic reload still bounds staleness
+            logger.info("Course change stream unavailable, reloading the catalog periodically: %s", e)
+        finally:
+            self.change_stream = False
+
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        """The current snapshot, or None if there is none within the staleness bound."""
+        snapshot = self._snapshot
+        if snapshot is None or snapshot.age() > self.max_staleness_seconds:
+            return None
+        return snapshot
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "courses": len(snapshot.courses) if snapshot else 0,
+            "categories": len(snapshot.by_category) if snapshot else 0,
+            "skill_tags": len(snapshot.by_skill) if snapshot else 0,
+            "age_seconds": round(snapshot.age(), 1) if snapshot else None,
+            "max_staleness_seconds": self.max_staleness_seconds,
+            "fresh": self.snapshot() is not None,
+            "change_stream": self.change_stream,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors
+        }
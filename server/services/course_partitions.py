@@ -0,0 +1,84 @@
+from typing import Callable, Dict, List, Optional
+import os
+import re
+import threading
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from services.lexical_index import BM25Index
+
+# Also valid inside Chroma collection names ("course_<code>")
+_COURSE_CODE = re.compile(r"^[A-Za-z0-9](?:[A-Za-z0-9_-]{0,48}[A-Za-z0-9])?$")
+
+
+def normalize_course_code(course_code: Optional[str]) -> Optional[str]:
+    """A course code as stored in Mongo (`CourseCode`), or None for no course.
+
+    Raises ValueError for codes that cannot name a partition.
+    """
+    if course_code is None:
+        return None
+    if not isinstance(course_code, str):
+        raise ValueError("course_code must be a string")
+    code = course_code.strip()
+    if not code:
+        return None
+    if not _COURSE_CODE.match(code):
+        raise ValueError(f"Invalid course code: {course_code!r}")
+    return code
+
+
+def default_document_id(source: str, course_code: Optional[str]) -> str:
+    """Document id used when the caller gives none: the source name, under its course.
+
+    Common names like "lecture1.pdf" then stay separate documents per course;
+    only an explicit document id can move a document between courses.
+    """
+    return f"{course_code}/{source}" if course_code is not None else source
+
+
+def partition_path(base_path: str, course_code: Optional[str]) -> str:
+    """Location of a course's copy of a file-backed index.
+
+    "./data/lexical_index.sqlite" -> "./data/lexical_index_courses/IT3100.sqlite";
+    the default partition keeps the original path.
+    """
+    if course_code is None:
+        return base_path
+    root, ext = os.path.splitext(base_path)
+    return os.path.join(f"{root}_courses", f"{course_code}{ext}")
+
+
+class IndexPartition:
+    """The vector store, lexical index and retriever holding one course's chunks."""
+
+    def __init__(self, course_code: Optional[str], vector_store: VectorStore,
+                 lexical_index: BM25Index, retriever: BaseRetriever):
+        self.course_code = course_code
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.retriever = retriever
+
+
+class CoursePartitions:
+    """Opens each course's IndexPartition on first use and keeps it open.
+
+    Documents without a course code live in the default partition (key None),
+    which is the store that existed before partitioning, so no migration is
+    needed. A course-scoped search only touches that course's partition.
+    """
+
+    def __init__(self, factory: Callable[[Optional[str]], IndexPartition]):
+        self._factory = factory
+        self._partitions: Dict[Optional[str], IndexPartition] = {}
+        self._lock = threading.Lock()
+
+    def get(self, course_code: Optional[str]) -> IndexPartition:
+        with self._lock:
+            partition = self._partitions.get(course_code)
+            if partition is None:
+                partition = self._partitions[course_code] = self._factory(course_code)
+            return partition
+
+    def open_courses(self) -> List[Optional[str]]:
+        with self._lock:
+            return list(self._partitions)
@@ -0,0 +1,100 @@
+from typing import List, Iterator
+import os
+import logging
+import chardet
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_community.document_loaders import (
+    TextLoader,
+    PDFMinerLoader as PDFLoader,
+    Docx2txtLoader as DocxLoader,
+    UnstructuredFileLoader,
+)
+
+# Parsing helpers shared by RAGService and the bulk ingester. Nothing here
+# touches the vector store or OpenAI, so they are safe in worker processes.
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ['.txt', '.pdf', '.doc', '.docx']
+
+# Characters of a streamed text file handed to the splitter at once
+TEXT_BLOCK_CHARS = 256 * 1024
+
+
+def create_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+    )
+
+
+def detect_encoding(file_path: str) -> str:
+    """Detect the encoding of a file, reading only as much as the detector needs."""
+    detector = chardet.UniversalDetector()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(64 * 1024), b''):
+            detector.feed(block)
+            if detector.done:
+                break
+    detector.close()
+    return detector.result['encoding'] or 'utf-8'
+
+
+def load_text_file(file_path: str) -> List[Document]:
+    """Load a text file with proper encoding detection."""
+    try:
+        encoding = detect_encoding(file_path)
+        loader = TextLoader(file_path, encoding=encoding)
+        return loader.load()
+    except Exception as e:
+        logger.error("Error loading text file: %s", e)
+        raise
+
+
+def load_documents(file_path: str) -> List[Document]:
+    """Parse a whole file into (unsplit) documents."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+
+    if file_extension == '.txt':
+        return load_text_file(file_path)
+
+    loaders = {
+        '.pdf': PDFLoader,
+        '.docx': DocxLoader,
+    }
+    loader_class = loaders.get(file_extension, UnstructuredFileLoader)
+    loader = loader_class(file_path)
+    return loader.load()
+
+
+def iter_text_file(file_path: str) -> Iterator[Document]:
+    """Yield a text file as documents of about TEXT_BLOCK_CHARS characters, cut at line ends."""
+    encoding = detect_encoding(file_path)
+    with open(file_path, encoding=encoding) as file:
+        lines, size = [], 0
+        for line in file:
+            lines.append(line)
+            size += len(line)
+            if size >= TEXT_BLOCK_CHARS:
+                yield Document(page_content="".join(lines), metadata={"source": file_path})
+                lines, size = [], 0
+        if lines:
+            yield Document(page_content="".join(lines), metadata={"source": file_path})
+
+
+def iter_documents(file_path: str) -> Iterator[Document]:
+    """Lazily parse a file: page by page for PDFs, block by block for text."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.txt':
+        return iter_text_file(file_path)
+    if file_extension == '.pdf':
+        return PDFLoader(file_path, mode="page").lazy_load()
+    loader_class = DocxLoader if file_extension == '.docx' else UnstructuredFileLoader
+    return loader_class(file_path).lazy_load()
+
+
+def load_and_split(file_path: str) -> List[Document]:
+    """Parse and split a file with the default splitter (process-pool entry point)."""
+    return create_text_splitter().split_documents(load_documents(file_path))
@@ -0,0 +1,130 @@
+from typing import Dict, Any, List, Optional, Tuple
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class DocumentRegistry:
+    """Manifest of ingested documents and the chunks each one owns.
+
+    For every stable document id it records the content hash of each chunk
+    and the vector store id it was written under, so a re-upload can tell
+    new, unchanged and stale chunks apart. Each document also records the
+    course whose partition holds its chunks (NULL for the default one).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents (doc_id TEXT PRIMARY KEY, source TEXT NOT NULL, "
+            "num_chunks INTEGER NOT NULL DEFAULT 0, updated_at TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (doc_id TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "vector_id TEXT NOT NULL, PRIMARY KEY (doc_id, content_hash)) WITHOUT ROWID"
+        )
+        # Registries created before course partitions lack the column
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(documents)")]
+        if "course_code" not in columns:
+            self._conn.execute("ALTER TABLE documents ADD COLUMN course_code TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_course ON documents (course_code)")
+        self._conn.commit()
+
+    def get_chunks(self, doc_id: str) -> Dict[str, str]:
+        """Map of content hash -> vector id for a document."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT content_hash, vector_id FROM chunks WHERE doc_id = ?", (doc_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def add_chunks(self, doc_id: str, source: str, chunks: List[Tuple[str, str]],
+                   course_code: Optional[str] = None):
+        """Record (content hash, vector id) pairs as soon as they are written."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO documents (doc_id, source, updated_at, course_code) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (doc_id) DO UPDATE SET source = excluded.source, updated_at = excluded.updated_at, "
+                "course_code = excluded.course_code",
+                (doc_id, source, datetime.utcnow().isoformat(), course_code)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (doc_id, content_hash, vector_id) VALUES (?, ?, ?)",
+                [(doc_id, content_hash, vector_id) for content_hash, vector_id in chunks]
+            )
+            self._conn.commit()
+
+    def remove_chunks(self, doc_id: str, content_hashes: List[str]):
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE doc_id = ? AND content_hash = ?",
+                [(doc_id, content_hash) for content_hash in content_hashes]
+            )
+            self._update_count(doc_id)
+            self._conn.commit()
+
+    def _update_count(self, doc_id: str):
+        self._conn.execute(
+            "UPDATE documents SET num_chunks = (SELECT COUNT(*) FROM chunks WHERE doc_id = ?), updated_at = ? "
+            "WHERE doc_id = ?",
+            (doc_id, datetime.utcnow().isoformat(), doc_id)
+        )
+
+    def finalize(self, doc_id: str):
+        """Refresh the document's chunk count after an ingestion pass."""
+        with self._lock:
+            self._update_count(doc_id)
+            self._conn.commit()
+
+    def delete_document(self, doc_id: str) -> List[str]:
+        """Forget a document and return the vector ids it owned."""
+        with self._lock:
+            vector_ids = [
+                row[0] for row in self._conn.execute("SELECT vector_id FROM chunks WHERE doc_id = ?", (doc_id,))
+            ]
+            self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._conn.commit()
+        return vector_ids
+
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_id, source, num_chunks, updated_at, course_code FROM documents WHERE doc_id = ?",
+                (doc_id,)
+            ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def has_course(self, course_code: str) -> bool:
+        """Whether any document was ingested into the course's partition."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM documents WHERE course_code = ? LIMIT 1", (course_code,)
+            ).fetchone() is not None
+
+    def list_documents(self, course_code: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT doc_id, source, num_chunks, updated_at, course_code FROM documents"
+        params: Tuple = ()
+        if course_code is not None:
+            query += " WHERE course_code = ?"
+            params = (course_code,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY updated_at DESC", params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row: Tuple) -> Dict[str, Any]:
+        doc_id, source, num_chunks, updated_at, course_code = row
+        return {
+            "document_id": doc_id,
+            "source": source,
+            "course_code": course_code,
+            "num_chunks": num_chunks,
+            "updated_at": updated_at
+        }
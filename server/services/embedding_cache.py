@@ -0,0 +1,123 @@
+from typing import List, Dict, Any
+import os
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from services.metrics import track_stage, record_items
+
+
+class CachedEmbeddings(Embeddings):
+    """Persistent, content-addressed cache in front of a document embedder.
+
+    Vectors are keyed by sha256(model name + chunk text) and stored as float32
+    blobs in SQLite, so re-ingesting an unchanged chunk never calls the API.
+    Query embeddings are kept in a small in-memory LRU instead, so a question
+    embedded for the answer cache is not embedded again for retrieval.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, cache_path: str, query_cache_size: int = 1000):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.hits = 0
+        self.misses = 0
+        self.query_cache_size = query_cache_size
+        self.query_hits = 0
+        self._query_vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items: List[tuple]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def uncached(self, texts: List[str]) -> List[str]:
+        """The distinct texts that embed_documents would still send to the API."""
+        keys = {self._key(text): text for text in texts}
+        cached = self._lookup(list(keys))
+        return [text for key, text in keys.items() if key not in cached]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        if missing:
+            with track_stage("embed_documents"):
+                vectors = self.underlying.embed_documents(list(missing.values()))
+            record_items("embed_documents", len(missing))
+            new_items = list(zip(missing.keys(), vectors))
+            self._store(new_items)
+            cached.update(new_items)
+
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        with self._lock:
+            vector = self._query_vectors.get(text)
+            if vector is not None:
+                self._query_vectors.move_to_end(text)
+                self.query_hits += 1
+                return vector
+
+        vector = self.underlying.embed_query(text)
+        if self.query_cache_size > 0:
+            with self._lock:
+                self._query_vectors[text] = vector
+                while len(self._query_vectors) > self.query_cache_size:
+                    self._query_vectors.popitem(last=False)
+        return vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": entries,
+                "query_hits": self.query_hits,
+                "query_entries": len(self._query_vectors)
+            }
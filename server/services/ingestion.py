@@ -0,0 +1,174 @@
+from typing import Dict, Any, List, Optional, BinaryIO
+import os
+import uuid
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fastapi import UploadFile
+
+from services.ragService import rag_service, RAGService
+from services.metrics import endpoint_scope
+from services.course_partitions import default_document_id
+
+logger = logging.getLogger(__name__)
+
+# Jobs allowed to wait for a worker before uploads are rejected
+INGEST_MAX_PENDING = int(os.getenv("RAG_INGEST_MAX_PENDING", "20"))
+# Finished jobs kept around so clients can still read their status
+INGEST_MAX_RETAINED = int(os.getenv("RAG_INGEST_MAX_RETAINED", "200"))
+# Bytes read from an upload and written to disk at a time
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+
+async def save_upload(upload: UploadFile, destination: BinaryIO) -> int:
+    """Copy an upload to disk in fixed-size blocks so it is never held in memory whole."""
+    written = 0
+    while True:
+        block = await upload.read(UPLOAD_BLOCK_SIZE)
+        if not block:
+            return written
+        destination.write(block)
+        written += len(block)
+
+
+class IngestionQueueFullError(Exception):
+    """Raised when too many ingestion jobs are already waiting."""
+
+
+class IngestionJob:
+    def __init__(self, file_path: str, filename: str, document_id: Optional[str] = None, cleanup: bool = True,
+                 course_code: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.filename = filename
+        self.document_id = document_id or default_document_id(filename, course_code)
+        self.course_code = course_code
+        self.cleanup = cleanup
+        self.status = "queued"
+        self.total_chunks: Optional[int] = 0
+        self.processed_chunks = 0
+        self.error: Optional[str] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def update_progress(self, processed_chunks: int, total_chunks: Optional[int]):
+        """Progress callback invoked by the worker thread after each batch.
+
+        total_chunks is None while a streamed document is still being parsed.
+        """
+        self.processed_chunks = processed_chunks
+        self.total_chunks = total_chunks
+
+    def to_dict(self) -> Dict[str, Any]:
+        progress = 0.0
+        if self.status == "completed":
+            progress = 100.0
+        elif self.total_chunks is None:
+            progress = None
+        elif self.total_chunks:
+            progress = round(self.processed_chunks / self.total_chunks * 100, 1)
+
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "document_id": self.document_id,
+            "course_code": self.course_code,
+            "status": self.status,
+            "progress": progress,
+            "processed_chunks": self.processed_chunks,
+            "total_chunks": self.total_chunks,
+            "error": self.error,
+            "result": self.result,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class IngestionJobManager:
+    """Runs document ingestion on a bounded worker pool off the event loop.
+
+    The pool defaults to the RAG service's ingestion pool, so jobs and direct
+    add_document/delete_document calls share one bound.
+    """
+
+    def __init__(self, rag: RAGService, max_pending: int = INGEST_MAX_PENDING,
+                 max_retained: int = INGEST_MAX_RETAINED, executor: Optional[ThreadPoolExecutor] = None):
+        self.rag = rag
+        self.max_pending = max_pending
+        self.max_retained = max_retained
+        self.executor = executor or rag.ingest_executor
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, file_path: str, filename: str, document_id: Optional[str] = None,
+               cleanup: bool = True, course_code: Optional[str] = None) -> IngestionJob:
+        """Queue a file for ingestion and return its job immediately."""
+        with self._lock:
+            pending = sum(1 for job in self.jobs.values() if job.status == "queued")
+            if pending >= self.max_pending:
+                raise IngestionQueueFullError(
+                    f"Too many documents waiting for ingestion ({pending}). Please try again later."
+                )
+            job = IngestionJob(file_path, filename, document_id=document_id, cleanup=cleanup,
+                               course_code=course_code)
+            self.jobs[job.id] = job
+            self._prune_finished()
+
+        self.executor.submit(self._run_job, job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [job.to_dict() for job in reversed(self.jobs.values())]
+
+    def _prune_finished(self):
+        """Drop the oldest finished jobs once more than max_retained are stored."""
+        excess = len(self.jobs) - self.max_retained
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.is_finished][:excess]:
+            del self.jobs[job_id]
+
+    def _run_job(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            with endpoint_scope("ingestion"):
+                result = self.rag.ingest_document(
+                    job.file_path,
+                    progress_callback=job.update_progress,
+                    document_id=job.document_id,
+                    source=job.filename,
+                    course_code=job.course_code
+                )
+            job.result = result
+            if result["status"] == "error":
+                job.status = "failed"
+                job.error = result["message"]
+            else:
+                job.status = "completed"
+        except Exception as e:
+            logger.exception("Ingestion job %s failed: %s", job.id, e)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+            if job.cleanup and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+
+# Create a singleton instance
+ingestion_manager = IngestionJobManager(rag_service)
@@ -1,34 +1,57 @@
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+import os
+import asyncio
+import logging
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson.objectid import ObjectId
+from services.metrics import track_stage
+from services.user_data_loader import UserDataLoader
+from services.course_catalog import CourseCatalog
+from services.recommender import CourseRecommender
+
+logger = logging.getLogger(__name__)
+
+# How get_user_details reads progress and courses: "find" (separate queries,
+# learning status built in Python) or "aggregate" (one $lookup pipeline)
+DETAILS_QUERY = os.getenv("LEARNING_PATH_DETAILS_QUERY", "find")
+DETAILS_QUERIES = ("find", "aggregate")
 
 class LearningPathService:
-    def __init__(self, db_client: AsyncIOMotorClient):
+    def __init__(self, db_client: AsyncIOMotorClient, details_query: str = DETAILS_QUERY,
+                 catalog: Optional[CourseCatalog] = None):
+        if details_query not in DETAILS_QUERIES:
+            raise ValueError(f"Unknown details query: {details_query}. Expected one of: {', '.join(DETAILS_QUERIES)}")
         self.db = db_client.get_default_database()
+        self.details_query = details_query
+        # Ranks the in-memory catalog while its snapshot is fresh
+        self.recommender = CourseRecommender(catalog) if catalog is not None else None
 
     async def generate_learning_path_advice(self, user_code: str) -> str:
         """Generate personalized learning path advice for a user"""
         try:
+            # One loader for the whole request, so user data is read from Mongo once
+            loader = UserDataLoader(self.db)
+
             # Get user details including progress
-            user_details = await self.get_user_details(user_code)
+            user_details = await self.get_user_details(user_code, loader)
             if not user_details or not user_details.get("user"):
                 raise ValueError(f"User not found: {user_code}")
 
             user = user_details["user"]
             learning_status = user_details["learning_status"]
 
-            # Get recommended courses
-            recommended_courses = await self.get_recommended_courses(user_code)
-
             # Calculate learning metrics
             total_courses = len(learning_status["completed_courses"]) + len(learning_status["in_progress_courses"])
             completion_rate = len(learning_status["completed_courses"]) / total_courses if total_courses > 0 else 0
             avg_time_per_course = learning_status["total_learning_time"] / total_courses if total_courses > 0 else 0
 
-            # Get AI-generated advice
+            # Get recommended courses and AI-generated advice; neither waits for the other
             from services import service_manager
-            ai_advice = await service_manager.ai_advisor_service.generate_advice(user_details)
+            recommended_courses, ai_advice = await asyncio.gather(
+                self.get_recommended_courses(user_code, loader),
+                service_manager.ai_advisor_service.generate_advice(user_details)
+            )
 
             # Format the advice string
             advice = f"Xin chào {user.get('Name', '')}, dựa trên quá trình học tập của bạn:\n\n"
@@ -53,7 +76,7 @@ class LearningPathService:
             return advice
 
         except Exception as e:
-            print(f"Error generating learning path advice: {str(e)}")
+            logger.error("Error generating learning path advice: %s", e)
             raise
 
     def _generate_suggested_path(self, learning_status: Dict, recommended_courses: List) -> List[Dict]:
@@ -91,38 +114,55 @@ class LearningPathService:
 
         return path
 
-    async def get_user_details(self, user_code: str) -> Dict:
-        """Get detailed user information including enrolled courses and progress"""
+    async def get_user_details(self, user_code: str, loader: Optional[UserDataLoader] = None) -> Dict:
+        """Get detailed user information including enrolled courses and progress
+
+        Pass the request's UserDataLoader to share the result with other calls.
+        """
+        loader = loader or UserDataLoader(self.db)
+        load = self._aggregate_user_details if self.details_query == "aggregate" else self._load_user_details
+        return await loader.load(("user_details", user_code), lambda: load(user_code, loader))
+
+    async def _aggregate_user_details(self, user_code: str, loader: UserDataLoader) -> Dict:
+        """get_user_details with the learning status computed by learning_profile_pipeline."""
         try:
-            # Get user basic info from User collection
-            print(f"Looking for user with code: {user_code}")
-            
-            # Try to find user with UserCode first
-            user = await self.db.User.find_one({"UserCode": user_code})
+            user, profile = await asyncio.gather(loader.user(user_code), loader.learning_profile(user_code))
+
             if not user:
-                # If not found, try with userId
-                print(f"User not found with UserCode, trying userId...")
-                user = await self.db.User.find_one({"userId": user_code})
-                
-            print(f"Found user: {user}")
-            
+                raise ValueError(f"User not found with code: {user_code}")
+
+            learning_status = {
+                "completed_courses": [],
+                "in_progress_courses": [],
+                "total_learning_time": 0,
+                "skill_levels": {skill["_id"]: skill["count"] for skill in profile["skills"]},
+                "preferred_categories": set()
+            }
+            for course_info in profile["courses"]:
+                completed = course_info.pop("completed")
+                learning_status["completed_courses" if completed else "in_progress_courses"].append(course_info)
+            if profile["totals"]:
+                totals = profile["totals"][0]
+                learning_status["total_learning_time"] = totals["total_learning_time"]
+                learning_status["preferred_categories"] = {category for category in totals["categories"] if category}
+
+            return {
+                "user": user,
+                "learning_status": learning_status
+            }
+        except Exception as e:
+            logger.error("Error getting user details: %s", e)
+            raise
+
+    async def _load_user_details(self, user_code: str, loader: UserDataLoader) -> Dict:
+        try:
+            # Get user basic info (by UserCode, else userId) and progress records together
+            user, progress_records = await loader.user_and_progress(user_code)
+
             if not user:
-                # Print all users for debugging
-                all_users = await self.db.User.find().to_list(length=None)
-                print("All users in database:")
-                for u in all_users:
-                    print(f"User: {u.get('userId')} / {u.get('UserCode')} - {u.get('Name')}")
                 raise ValueError(f"User not found with code: {user_code}")
 
-            # Get user's progress from UserProgress collection
-            print(f"Getting progress records for user: {user_code}")
-            progress_records = await self.db.UserProgress.find({
-                "$or": [
-                    {"UserCode": user_code},  # Changed to match database schema
-                    {"userId": user_code}
-                ]
-            }).to_list(length=None)
-            print(f"Found progress records: {progress_records}")
+            logger.debug("Found %d progress records for user %s", len(progress_records), user_code)
 
             if not progress_records:
                 # Return basic user info if no progress records found
@@ -139,16 +179,8 @@ class LearningPathService:
 
             # Get all relevant course details from Course collection
             course_codes = [p.get("CourseCode") for p in progress_records if p.get("CourseCode")]  # Changed to match database schema
-            print(f"Looking for courses with codes: {course_codes}")
-            courses = await self.db.Course.find({
-                "CourseCode": {"$in": course_codes}
-            }).to_list(length=None)
-            print(f"Found courses: {courses}")
-
-            # Organize course information
-            course_details = {}
-            for course in courses:
-                course_details[course["CourseCode"]] = course
+            course_details = await loader.courses(course_codes)
+            logger.debug("Found %d of %d courses for user %s", len(course_details), len(course_codes), user_code)
 
             # Organize user's learning status
             learning_status = {
@@ -200,12 +232,13 @@ class LearningPathService:
                 "learning_status": learning_status
             }
         except Exception as e:
-            print(f"Error getting user details: {str(e)}")
+            logger.error("Error getting user details: %s", e)
             raise
 
-    async def get_recommended_courses(self, user_code: str) -> List[Dict[str, Any]]:
+    async def get_recommended_courses(self, user_code: str,
+                                      loader: Optional[UserDataLoader] = None) -> List[Dict[str, Any]]:
         try:
-            user_details = await self.get_user_details(user_code)
+            user_details = await self.get_user_details(user_code, loader)
             learning_status = user_details["learning_status"]
 
             # Get current course IDs to exclude
@@ -214,6 +247,12 @@ class LearningPathService:
                 for c in learning_status["completed_courses"] + learning_status["in_progress_courses"]
             ]
 
+            if self.recommender is not None:
+                # Best five of the whole catalog, each with its "score"
+                recommended_courses = self.recommender.recommend(learning_status, k=5)
+                if recommended_courses is not None:
+                    return recommended_courses
+
             # Build base query - only exclude current courses and ensure active status
             query = {
                 "CourseCode": {"$nin": current_course_codes},
@@ -229,7 +268,8 @@ class LearningPathService:
                 ]
 
             # Get recommendations from Course collection
-            recommended_courses = await self.db.Course.find(query).limit(5).to_list(length=None)
+            with track_stage("mongo_recommend_courses"):
+                recommended_courses = await self.db.Course.find(query).limit(5).to_list(length=None)
             
             # If no courses found with filters, try without category/skill filters
             if not recommended_courses:
@@ -237,12 +277,13 @@ class LearningPathService:
                     "Status": "Active",
                     "CourseCode": {"$nin": current_course_codes}
                 }
-                recommended_courses = await self.db.Course.find(basic_query).limit(5).to_list(length=None)
+                with track_stage("mongo_recommend_courses"):
+                    recommended_courses = await self.db.Course.find(basic_query).limit(5).to_list(length=None)
 
             return recommended_courses
 
         except Exception as e:
-            print(f"Error getting recommended courses: {str(e)}")
+            logger.error("Error getting recommended courses: %s", e)
             raise
 
 # Create singleton instance
@@ -0,0 +1,203 @@
+from typing import List, Dict, Any, Optional, Tuple
+import os
+import re
+import json
+import math
+import heapq
+import sqlite3
+import threading
+import logging
+import unicodedata
+from collections import Counter
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from services.metrics import track_stage
+from services.reranking import rerank_mmr
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _fold(token: str) -> str:
+    """Strip Vietnamese diacritics: "đạo" -> "dao"."""
+    decomposed = unicodedata.normalize("NFD", token.replace("đ", "d"))
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens.
+
+    Tokens keep their diacritics; accented tokens are also emitted in folded
+    form so that queries typed without accents still match.
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text).lower()):
+        tokens.append(token)
+        folded = _fold(token)
+        if folded != token:
+            tokens.append(folded)
+    return tokens
+
+
+def chunk_key(doc: Document) -> str:
+    """Identity of a chunk across retrievers: its chunk id, or its text for legacy chunks."""
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+class BM25Index:
+    """Persistent inverted index with BM25 scoring, stored in SQLite.
+
+    Postings are (term, chunk id, term frequency); documents can be added
+    and deleted incrementally as chunks are ingested or replaced.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, text TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, length INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id)")
+        self._conn.commit()
+
+        self._num_docs, total_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs"
+        ).fetchone()
+        self._total_length = total_length
+
+    def _delete_locked(self, ids: List[str]):
+        for doc_id in ids:
+            row = self._conn.execute("SELECT length FROM docs WHERE id = ?", (doc_id,)).fetchone()
+            if not row:
+                continue
+            self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+            self._num_docs -= 1
+            self._total_length -= row[0]
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None):
+        metadatas = metadatas or [{} for _ in texts]
+        with self._lock:
+            # Re-adding an id replaces the previous version
+            self._delete_locked(ids)
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                self._conn.execute(
+                    "INSERT INTO docs (id, text, metadata, length) VALUES (?, ?, ?, ?)",
+                    (doc_id, text, json.dumps(metadata, ensure_ascii=False, default=str), length)
+                )
+                self._conn.executemany(
+                    "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                    [(term, doc_id, tf) for term, tf in counts.items()]
+                )
+                self._num_docs += 1
+                self._total_length += length
+            self._conn.commit()
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._delete_locked(ids)
+            self._conn.commit()
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[Document, float]]:
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        scores: Dict[str, float] = {}
+        with self._lock:
+            if not self._num_docs:
+                return []
+            avg_length = self._total_length / self._num_docs
+            for term in terms:
+                postings = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc_id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (self._num_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf, length in postings:
+                    norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            top = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            if not top:
+                return []
+            placeholders = ",".join("?" * len(top))
+            records = self._conn.execute(
+                f"SELECT id, text, metadata FROM docs WHERE id IN ({placeholders})", [doc_id for doc_id, _ in top]
+            ).fetchall()
+
+        docs = {
+            doc_id: Document(id=doc_id, page_content=text, metadata=json.loads(metadata))
+            for doc_id, text, metadata in records
+        }
+        return [(docs[doc_id], score) for doc_id, score in top if doc_id in docs]
+
+    def count(self) -> int:
+        return self._num_docs
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses vector similarity and BM25 rankings with reciprocal rank fusion.
+
+    If vector search fails, the BM25 ranking is used alone. With rerank
+    enabled, the fused candidates are re-ordered by maximal marginal
+    relevance over their stored embeddings before the top k is taken.
+    """
+
+    vector_store: VectorStore
+    lexical_index: BM25Index
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    rerank: bool = False
+    mmr_lambda: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        try:
+            with track_stage("vector_search"):
+                vector_ranking = self.vector_store.similarity_search(query, k=self.fetch_k)
+        except Exception as e:
+            # Embeddings or vector store unavailable: keyword matches still answer the question
+            logger.warning("Vector search failed, using BM25 results only: %s", e)
+            vector_ranking = []
+        with track_stage("lexical_search"):
+            lexical_ranking = [doc for doc, _ in self.lexical_index.search(query, k=self.fetch_k)]
+        rankings = [vector_ranking, lexical_ranking]
+
+        fused: Dict[str, float] = {}
+        docs: Dict[str, Document] = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking, 1):
+                key = chunk_key(doc)
+                fused[key] = fused.get(key, 0.0) + 1 / (self.rrf_k + rank)
+                docs.setdefault(key, doc)
+
+        if not self.rerank or not fused:
+            top = heapq.nlargest(self.k, fused.items(), key=lambda item: item[1])
+            return [docs[key] for key, _ in top]
+
+        candidates = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+        scores = np.array([score for _, score in candidates])
+        # Fused scores as relevance, so lexical-only hits are not judged by cosine alone
+        return rerank_mmr(self.vector_store, [docs[key] for key, _ in candidates],
+                          self.k, self.mmr_lambda, relevance=scores / scores.max())
@@ -0,0 +1,145 @@
+from typing import Any, Optional
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import reprlib
+from logging.handlers import QueueHandler, QueueListener
+
+# Minimum level emitted: DEBUG, INFO, WARNING, ERROR
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" for humans, "json" for log shippers
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Fraction of DEBUG/INFO records kept; warnings and errors are never sampled
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Longest rendering of a single message argument
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500"))
+# Records buffered for the writer thread; beyond this they are dropped, never waited on
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a random fraction of records below WARNING."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without formatting or blocking the caller.
+
+    The stock QueueHandler formats the message in the calling thread; here
+    that work (and any large argument rendering) is left to the listener.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TruncatingFormatter(logging.Formatter):
+    """Renders message arguments with bounded size before formatting."""
+
+    def __init__(self, fmt: Optional[str] = None, json_output: bool = False, max_chars: int = LOG_MAX_FIELD_CHARS):
+        super().__init__(fmt)
+        self.json_output = json_output
+        self.max_chars = max_chars
+        # Bounded repr: large documents and lists are elided instead of serialized whole
+        self._repr = reprlib.Repr()
+        self._repr.maxstring = max_chars
+        self._repr.maxother = max_chars
+        self._repr.maxdict = 20
+        self._repr.maxlist = 20
+        self._repr.maxlevel = 3
+
+    def _render(self, value: Any) -> Any:
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        if isinstance(value, (dict, list, tuple, set)):
+            return self._repr.repr(value)
+        text = str(value)
+        return text if len(text) <= self.max_chars else text[:self.max_chars] + "...[truncated]"
+
+    def format(self, record: logging.LogRecord) -> str:
+        if record.args:
+            args = record.args if isinstance(record.args, tuple) else (record.args,)
+            record.args = tuple(self._render(arg) for arg in args)
+        message = record.getMessage()
+        if len(message) > self.max_chars * 4:
+            message = message[:self.max_chars * 4] + "...[truncated]"
+
+        if not self.json_output:
+            record.message = message
+            record.msg, record.args = message, None
+            return super().format(record)
+
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": message,
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT,
+                      sample_rate: float = LOG_SAMPLE_RATE) -> None:
+    """Route all logging through a bounded queue to a background writer thread.
+
+    Safe to call more than once; only the first call installs the handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TruncatingFormatter(
+        "%(asctime)s %(levelname)s %(name)s: %(message)s",
+        json_output=log_format == "json"
+    ))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.handlers = [queue_handler]
+    # uvicorn installs its own console handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,206 @@
+from typing import Any, Dict, Optional, List
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from starlette.routing import Match
+
+# Route template of the request being served ("background" outside requests).
+# Thread pool hops must copy the context for the label to follow the work.
+current_endpoint: ContextVar[str] = ContextVar("metrics_endpoint", default="background")
+
+# From cache hits and Mongo lookups up to slow GPT-4 answers
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    "app_stage_duration_seconds",
+    "Time spent in one stage of a request (embedding, search, LLM call, Mongo query, ...)",
+    ["stage", "endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+STAGE_ITEMS = Counter(
+    "app_stage_items_total",
+    "Items handled by a stage (texts embedded, chunks produced, documents retrieved, ...)",
+    ["stage", "endpoint"],
+)
+SINGLE_FLIGHT_CALLS = Counter(
+    "app_single_flight_calls_total",
+    "Deduplicated upstream calls: executed, or collapsed into one already in flight",
+    ["name", "result"],
+)
+CIRCUIT_CALLS = Counter(
+    "app_circuit_calls_total",
+    "Calls to a dependency behind a circuit breaker: success, failure, or rejected while open",
+    ["name", "result"],
+)
+CIRCUIT_STATE = Gauge(
+    "app_circuit_state",
+    "Circuit breaker state per dependency: 0 closed, 1 half-open, 2 open",
+    ["name"],
+)
+REQUEST_SECONDS = Histogram(
+    "app_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "endpoint", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+# LangChain runs carrying a "stage:<name>" tag are reported under that name
+STAGE_TAG_PREFIX = "stage:"
+
+
+def observe_stage(stage: str, seconds: float, outcome: str = "success", endpoint: Optional[str] = None):
+    STAGE_SECONDS.labels(stage, endpoint or current_endpoint.get(), outcome).observe(seconds)
+
+
+def record_items(stage: str, count: int):
+    if count:
+        STAGE_ITEMS.labels(stage, current_endpoint.get()).inc(count)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time the enclosed block; an escaping exception is recorded as outcome="error"."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        observe_stage(stage, time.perf_counter() - start, outcome)
+
+
+@contextmanager
+def endpoint_scope(endpoint: str):
+    """Attribute stages to a non-HTTP caller such as the ingestion workers."""
+    token = current_endpoint.set(endpoint)
+    try:
+        yield
+    finally:
+        current_endpoint.reset(token)
+
+
+class StageTimingCallback(BaseCallbackHandler):
+    """Times LLM and retriever runs inside LangChain chains.
+
+    Pass it in the run config. A chain's own tags are not inherited by its
+    child runs, so the stage tag of the nearest tagged ancestor chain is
+    tracked here. The endpoint is captured when a run starts, so it is
+    attributed correctly even if the run ends on another thread.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._runs: Dict[UUID, tuple] = {}
+        self._chain_stages: Dict[UUID, Optional[str]] = {}
+
+    def _stage(self, tags: Optional[List[str]], parent_run_id: Optional[UUID], default: Optional[str]) -> Optional[str]:
+        for tag in tags or []:
+            if tag.startswith(STAGE_TAG_PREFIX):
+                return tag[len(STAGE_TAG_PREFIX):]
+        return self._chain_stages.get(parent_run_id) or default
+
+    def _start(self, run_id: UUID, stage: str):
+        self._runs[run_id] = (stage, current_endpoint.get(), time.perf_counter())
+
+    def _end(self, run_id: UUID, outcome: str):
+        run = self._runs.pop(run_id, None)
+        if run:
+            stage, endpoint, start = run
+            observe_stage(stage, time.perf_counter() - start, outcome, endpoint)
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None, **kwargs: Any):
+        self._chain_stages[run_id] = self._stage(tags, parent_run_id, None)
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any):
+        self._chain_stages.pop(run_id, None)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._chain_stages.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[Any], *, run_id: UUID,
+                            parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None, **kwargs: Any):
+        self._start(run_id, self._stage(tags, parent_run_id, "llm"))
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID,
+                     parent_run_id: Optional[UUID] = None, tags: Optional[List[str]] = None, **kwargs: Any):
+        self._start(run_id, self._stage(tags, parent_run_id, "llm"))
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "success")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "error")
+
+    def on_retriever_start(self, serialized: Dict[str, Any], query: str, *, run_id: UUID,
+                           tags: Optional[List[str]] = None, **kwargs: Any):
+        self._start(run_id, self._stage(tags, None, "retrieval"))
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "success")
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._end(run_id, "error")
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+    """Resolve the matching route's path template to keep label cardinality bounded."""
+    app = scope.get("app")
+    for route in getattr(getattr(app, "router", None), "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+def _request_outcome(status: int) -> str:
+    if status >= 500:
+        return "error"
+    if status >= 400:
+        return "client_error"
+    return "success"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency and labelling stages with the route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint = _route_template(scope)
+        token = current_endpoint.set(endpoint)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Streaming responses are timed until their last chunk is sent
+            REQUEST_SECONDS.labels(scope["method"], endpoint, _request_outcome(status)).observe(
+                time.perf_counter() - start
+            )
+            current_endpoint.reset(token)
+
+
+def render_metrics() -> tuple:
+    """Body and content type for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# Shared handler passed to chain and model runs
+stage_timing_callback = StageTimingCallback()
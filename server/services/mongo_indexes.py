@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Tuple
+import logging
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Indexes behind the learning-path queries, by collection. Creating an index
+# that already exists with the same keys and options is a no-op.
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "User": [
+        IndexModel([("UserCode", ASCENDING)], name="UserCode_1"),
+        IndexModel([("userId", ASCENDING)], name="userId_1"),
+    ],
+    "UserProgress": [
+        # Also serves the progress -> course join of the details pipeline
+        IndexModel([("UserCode", ASCENDING), ("CourseCode", ASCENDING)], name="UserCode_1_CourseCode_1"),
+        IndexModel([("userId", ASCENDING)], name="userId_1"),
+        # Spelling used by the debug endpoint
+        IndexModel([("userCode", ASCENDING)], name="userCode_1"),
+    ],
+    "Course": [
+        # Course lookups by code ($in) and the $lookup in the details pipeline
+        IndexModel([("CourseCode", ASCENDING)], name="CourseCode_1"),
+        # Recommendations: Status equality, then each $or branch on category or skillTags
+        IndexModel([("Status", ASCENDING), ("category", ASCENDING)], name="Status_1_category_1"),
+        IndexModel([("Status", ASCENDING), ("skillTags", ASCENDING)], name="Status_1_skillTags_1"),
+    ],
+}
+
+# Server error code for an index whose keys exist with a different name or options
+INDEX_OPTIONS_CONFLICT = 85
+
+_SAMPLE = "__index_check__"
+
+# Representative filters of the hot queries: (name, collection, filter)
+HOT_QUERIES: List[Tuple[str, str, Dict[str, Any]]] = [
+    ("find_user", "User", {"$or": [{"UserCode": _SAMPLE}, {"userId": _SAMPLE}]}),
+    ("find_user_by_code", "User", {"UserCode": _SAMPLE}),
+    ("find_user_by_id", "User", {"userId": _SAMPLE}),
+    ("find_progress", "UserProgress", {"$or": [{"UserCode": _SAMPLE}, {"userId": _SAMPLE}]}),
+    ("find_progress_debug", "UserProgress", {"$or": [{"userCode": _SAMPLE}, {"userId": _SAMPLE}]}),
+    ("find_courses", "Course", {"CourseCode": {"$in": [_SAMPLE]}}),
+    ("recommend_courses", "Course", {
+        "CourseCode": {"$nin": [_SAMPLE]},
+        "Status": "Active",
+        "$or": [{"category": {"$in": [_SAMPLE]}}, {"skillTags": {"$in": [_SAMPLE]}}],
+    }),
+    ("recommend_courses_fallback", "Course", {"Status": "Active", "CourseCode": {"$nin": [_SAMPLE]}}),
+]
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create every index in REQUIRED_INDEXES; returns the index names per collection."""
+    created = {}
+    for collection, indexes in REQUIRED_INDEXES.items():
+        names = []
+        for index in indexes:
+            try:
+                names.extend(await db[collection].create_indexes([index]))
+            except OperationFailure as e:
+                # The same keys are already indexed under another name, which serves as well
+                if e.code != INDEX_OPTIONS_CONFLICT:
+                    raise
+                logger.info("Index %s on %s already exists under another name", index.document["name"], collection)
+                names.append(index.document["name"])
+        created[collection] = names
+        logger.info("Indexes ensured on %s: %s", collection, ", ".join(names))
+    return created
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    """Every "stage" named anywhere in an explain() plan tree."""
+    if isinstance(plan, dict):
+        stages = [plan["stage"]] if isinstance(plan.get("stage"), str) else []
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+        return stages
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _plan_stages(item)]
+    return []
+
+
+async def check_query_plans(db) -> List[Dict[str, Any]]:
+    """Explain each hot query and report whether its winning plan scans a whole collection."""
+    results = []
+    for name, collection, query in HOT_QUERIES:
+        explain = await db.command("explain", {"find": collection, "filter": query}, verbosity="queryPlanner")
+        stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+        results.append({
+            "query": name,
+            "collection": collection,
+            "stages": stages,
+            "collection_scan": "COLLSCAN" in stages,
+        })
+    return results
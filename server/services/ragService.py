@@ -1,35 +1,217 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator, Iterator, Tuple
 import os
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores.chroma import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import (
-    TextLoader,
-    PDFMinerLoader as PDFLoader,
-    Docx2txtLoader as DocxLoader,
-    UnstructuredFileLoader,
-)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-import chardet
+from langchain.chains.conversational_retrieval.base import _get_chat_history
 from dotenv import load_dotenv, find_dotenv
-import traceback
+import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 import functools
+import contextvars
+import uuid
+import hashlib
+import threading
+from services.embedding_cache import CachedEmbeddings
+from services.batch_embedder import CoalescingEmbeddings
+from services.session_memory import SessionMemoryStore
+from services.answer_cache import SemanticAnswerCache
+from services.vector_store import create_vector_store
+from services.lexical_index import BM25Index, HybridRetriever
+from services.reranking import VectorRetriever
+from services.document_registry import DocumentRegistry
+from services.document_loader import create_text_splitter, load_documents, iter_documents
+from services.metrics import track_stage, record_items, stage_timing_callback
+from services.single_flight import SingleFlight, flight_key, normalize_prompt
+from services.circuit_breaker import CircuitBreaker, GuardedEmbeddings
+from services.course_partitions import CoursePartitions, IndexPartition, partition_path, default_document_id
 
 # Force reload environment variables
 load_dotenv(find_dotenv(), override=True)
 
+logger = logging.getLogger(__name__)
+
+# Vector store backend: "chroma" (default) or "numpy" (in-process exact index)
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+VECTOR_STORE_DIR = os.getenv(
+    "RAG_VECTOR_STORE_DIR",
+    "./data/chroma_db" if VECTOR_BACKEND == "chroma" else f"./data/{VECTOR_BACKEND}_index"
+)
+NUMPY_INDEX_DTYPE = os.getenv("RAG_NUMPY_INDEX_DTYPE", "float32")
+
+# Retrieval: "hybrid" fuses BM25 and vector rankings, "vector" is similarity only
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid")
+HYBRID_FETCH_K = int(os.getenv("RAG_HYBRID_FETCH_K", "20"))
+# Chunks passed to the answer prompt; requests may override up to the max
+RETRIEVAL_K = int(os.getenv("RAG_RETRIEVAL_K", "3"))
+RETRIEVAL_MAX_K = int(os.getenv("RAG_RETRIEVAL_MAX_K", "20"))
+# MMR re-ranking of the fetched candidates over their stored embeddings
+RERANK_ENABLED = os.getenv("RAG_RERANK_ENABLED", "false").lower() == "true"
+MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", "0.5"))
+LEXICAL_INDEX_PATH = os.getenv("RAG_LEXICAL_INDEX_PATH", "./data/lexical_index.sqlite")
+DOCUMENT_REGISTRY_PATH = os.getenv("RAG_DOCUMENT_REGISTRY_PATH", "./data/document_registry.sqlite")
+
+# Number of chunks embedded and written to the vector store per call
+INGEST_BATCH_SIZE = int(os.getenv("RAG_INGEST_BATCH_SIZE", "64"))
+# Files at least this large are parsed and indexed as a stream of batches
+STREAMING_INGEST_MIN_BYTES = int(os.getenv("RAG_STREAMING_INGEST_MIN_BYTES", str(20 * 1024 * 1024)))
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_PATH = os.getenv("RAG_EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite")
+# Recent query vectors kept in memory, shared by the answer cache and retrieval
+QUERY_VECTOR_CACHE_SIZE = int(os.getenv("RAG_QUERY_VECTOR_CACHE_SIZE", "1000"))
+
+# Follow-up questions: "condense" rewrites them into a standalone question
+# with CONDENSE_MODEL; "recent_turns" skips that LLM call and retrieves and
+# answers with the question prefixed by the most recent turns
+CONDENSE_MODE = os.getenv("RAG_CONDENSE_MODE", "condense")
+CONDENSE_MODES = ("condense", "recent_turns")
+CONDENSE_MODEL = os.getenv("RAG_CONDENSE_MODEL", "gpt-4o-mini")
+RECENT_TURNS = int(os.getenv("RAG_RECENT_TURNS", "2"))
+RECENT_TURNS_MAX_CHARS = int(os.getenv("RAG_RECENT_TURNS_MAX_CHARS", "1000"))
+
+# Worker pools and timeouts for blocking calls
+LLM_MAX_WORKERS = int(os.getenv("RAG_LLM_WORKERS", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("RAG_LLM_TIMEOUT_SECONDS", "60"))
+SEARCH_MAX_WORKERS = int(os.getenv("RAG_SEARCH_WORKERS", "8"))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("RAG_SEARCH_TIMEOUT_SECONDS", "15"))
+# Documents parsed, embedded and written (or deleted) at the same time, shared
+# by background ingestion jobs and direct add_document/delete_document calls
+INGEST_MAX_WORKERS = int(os.getenv("RAG_INGEST_WORKERS", "2"))
+
+# Circuit breakers for the embeddings API, vector retrieval and the chat model.
+# A circuit opens when BREAKER_FAILURE_RATE of the last BREAKER_WINDOW calls
+# failed (after at least BREAKER_MIN_CALLS) and fails fast for BREAKER_OPEN_SECONDS.
+BREAKER_FAILURE_RATE = float(os.getenv("RAG_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW = int(os.getenv("RAG_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("RAG_BREAKER_MIN_CALLS", "5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("RAG_BREAKER_OPEN_SECONDS", "30"))
+# Timeouts adapt to TIMEOUT_MULTIPLIER x the TIMEOUT_PERCENTILE of recent
+# latencies, between the minimums below and the timeouts above
+TIMEOUT_PERCENTILE = float(os.getenv("RAG_TIMEOUT_PERCENTILE", "99"))
+TIMEOUT_MULTIPLIER = float(os.getenv("RAG_TIMEOUT_MULTIPLIER", "2"))
+LLM_MIN_TIMEOUT_SECONDS = float(os.getenv("RAG_LLM_MIN_TIMEOUT_SECONDS", "10"))
+SEARCH_MIN_TIMEOUT_SECONDS = float(os.getenv("RAG_SEARCH_MIN_TIMEOUT_SECONDS", "2"))
+
+# Query embedding micro-batching
+QUERY_BATCH_WINDOW_MS = float(os.getenv("RAG_QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("RAG_QUERY_BATCH_MAX_SIZE", "32"))
+
+# Conversation memory bounds
+SESSION_MAX_SESSIONS = int(os.getenv("RAG_SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_TURNS = int(os.getenv("RAG_SESSION_MAX_TURNS", "5"))
+SESSION_TTL_SECONDS = float(os.getenv("RAG_SESSION_TTL_SECONDS", "3600"))
+
+# Semantic answer cache for repeated standalone questions
+ANSWER_CACHE_ENABLED = os.getenv("RAG_ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("RAG_ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("RAG_ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+
+def parse_retrieval_options(options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validate per-request retrieval overrides (k, fetch_k, mmr_lambda, rerank).
+
+    Missing or None values keep the service defaults. Raises ValueError on
+    unknown keys or out-of-range values.
+    """
+    if options is not None and not isinstance(options, dict):
+        raise ValueError("retrieval options must be an object")
+    options = {name: value for name, value in (options or {}).items() if value is not None}
+    unknown = set(options) - {"k", "fetch_k", "mmr_lambda", "rerank"}
+    if unknown:
+        raise ValueError(f"Unknown retrieval options: {', '.join(sorted(unknown))}")
+
+    parsed: Dict[str, Any] = {}
+    if "k" in options:
+        parsed["k"] = int(options["k"])
+        if not 1 <= parsed["k"] <= RETRIEVAL_MAX_K:
+            raise ValueError(f"k must be between 1 and {RETRIEVAL_MAX_K}")
+    if "fetch_k" in options:
+        parsed["fetch_k"] = int(options["fetch_k"])
+        if not parsed.get("k", 1) <= parsed["fetch_k"] <= RETRIEVAL_MAX_K * 10:
+            raise ValueError(f"fetch_k must be between k and {RETRIEVAL_MAX_K * 10}")
+    if "mmr_lambda" in options:
+        parsed["mmr_lambda"] = float(options["mmr_lambda"])
+        if not 0.0 <= parsed["mmr_lambda"] <= 1.0:
+            raise ValueError("mmr_lambda must be between 0 and 1")
+    if "rerank" in options:
+        if not isinstance(options["rerank"], bool):
+            raise ValueError("rerank must be a boolean")
+        parsed["rerank"] = options["rerank"]
+    return parsed
+
+
+def parse_chat_history(history: Any) -> List[Tuple[str, str]]:
+    """Normalize client-sent chat history into (question, answer) pairs.
+
+    Accepts a list of {"question", "answer"} objects, [question, answer]
+    pairs, or {"role", "content"} messages (user/human and assistant/ai),
+    which are paired up in order. Keeps the last SESSION_MAX_TURNS turns.
+    Raises ValueError on any other shape.
+    """
+    if history is None:
+        return []
+    if not isinstance(history, (list, tuple)):
+        raise ValueError("chat_history must be a list")
+
+    turns: List[Tuple[str, str]] = []
+    question: Optional[str] = None
+    for index, entry in enumerate(history):
+        if isinstance(entry, dict) and "role" in entry:
+            role, content = entry.get("role"), entry.get("content")
+            if not isinstance(content, str) or role not in ("user", "human", "assistant", "ai"):
+                raise ValueError(f"Unsupported chat_history message at index {index}")
+            if role in ("user", "human"):
+                if question is not None:
+                    turns.append((question, ""))
+                question = content
+            else:
+                # Assistant messages without a question (e.g. upload notices) answer an empty one
+                turns.append((question or "", content))
+                question = None
+            continue
+
+        if question is not None:
+            turns.append((question, ""))
+            question = None
+        if isinstance(entry, dict) and "question" in entry:
+            pair = (entry["question"], entry.get("answer") or "")
+        elif isinstance(entry, (list, tuple)) and len(entry) == 2:
+            pair = tuple(entry)
+        else:
+            raise ValueError(f"Unsupported chat_history entry at index {index}")
+        if not all(isinstance(text, str) for text in pair):
+            raise ValueError(f"chat_history entry at index {index} must hold strings")
+        turns.append(pair)
+
+    if question is not None:
+        turns.append((question, ""))
+    return turns[-SESSION_MAX_TURNS:]
+
+
 class RAGService:
-    def __init__(self):
+    def __init__(self, embeddings: Optional[Embeddings] = None, llm: Optional[BaseChatModel] = None,
+                 vector_store_dir: str = VECTOR_STORE_DIR, lexical_index_path: str = LEXICAL_INDEX_PATH,
+                 document_registry_path: str = DOCUMENT_REGISTRY_PATH,
+                 embedding_cache_path: str = EMBEDDING_CACHE_PATH,
+                 condense_llm: Optional[BaseChatModel] = None):
+        """Build the service; embeddings and llm default to OpenAI models.
+
+        Passing them in (together with scratch storage paths) lets the
+        service run without network access, e.g. in the benchmarks.
+        condense_llm defaults to CONDENSE_MODEL, or to llm when llm is given.
+        """
         try:
-            # Ensure the Chroma DB directory exists
-            os.makedirs("./data/chroma_db", exist_ok=True)
+            # Ensure the vector store directory exists
+            os.makedirs(vector_store_dir, exist_ok=True)
             
             # Get API key
             self.api_key = os.getenv("OPENAI_API_KEY")
-            if not self.api_key:
+            if not self.api_key and (embeddings is None or llm is None):
                 raise ValueError("OPENAI_API_KEY not found in environment")
             
             # Define system prompt
@@ -57,215 +239,692 @@ Luôn:
 - Đưa ra thông tin chính xác dựa trên tài liệu
 - Tổ chức câu trả lời có cấu trúc rõ ràng"""
 
-            print("Initializing OpenAI embeddings...")
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=self.api_key,
-                model="text-embedding-3-small",
-                timeout=60  # Increase timeout for embeddings
+            def breaker(name: str, min_timeout: float, max_timeout: float) -> CircuitBreaker:
+                return CircuitBreaker(
+                    name,
+                    failure_rate=BREAKER_FAILURE_RATE,
+                    min_calls=BREAKER_MIN_CALLS,
+                    window=BREAKER_WINDOW,
+                    open_seconds=BREAKER_OPEN_SECONDS,
+                    min_timeout=min_timeout,
+                    max_timeout=max_timeout,
+                    timeout_percentile=TIMEOUT_PERCENTILE,
+                    timeout_multiplier=TIMEOUT_MULTIPLIER
+                )
+
+            # A degraded dependency fails fast instead of costing every request a full timeout
+            self.breakers = {
+                "embeddings": breaker("embeddings", SEARCH_MIN_TIMEOUT_SECONDS, SEARCH_TIMEOUT_SECONDS),
+                "vector_store": breaker("vector_store", SEARCH_MIN_TIMEOUT_SECONDS, SEARCH_TIMEOUT_SECONDS),
+                "chat_model": breaker("chat_model", LLM_MIN_TIMEOUT_SECONDS, LLM_TIMEOUT_SECONDS),
+            }
+
+            logger.info("Initializing OpenAI embeddings...")
+            # Concurrent query embeddings are coalesced into batched requests
+            self.query_embedder = CoalescingEmbeddings(
+                embeddings or OpenAIEmbeddings(
+                    openai_api_key=self.api_key,
+                    model=EMBEDDING_MODEL,
+                    timeout=60  # Increase timeout for embeddings
+                ),
+                window_ms=QUERY_BATCH_WINDOW_MS,
+                max_batch_size=QUERY_BATCH_MAX_SIZE
             )
-            
-            print("Initializing ChromaDB...")
-            self.vector_store = Chroma(
-                persist_directory="./data/chroma_db",
-                embedding_function=self.embeddings
+            # Chunk embeddings go through a persistent cache keyed by text + model
+            self.embeddings = CachedEmbeddings(
+                GuardedEmbeddings(self.query_embedder, self.breakers["embeddings"]),
+                model_name=EMBEDDING_MODEL,
+                cache_path=embedding_cache_path,
+                query_cache_size=QUERY_VECTOR_CACHE_SIZE
             )
             
-            print("Initializing text splitter...")
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len,
-            )
+            logger.info("Initializing vector store (%s) and lexical index...", VECTOR_BACKEND)
+            self.vector_store_dir = vector_store_dir
+            self.lexical_index_path = lexical_index_path
+            # Each course's chunks get their own vector store and lexical index;
+            # documents without a course stay in the default partition
+            self.partitions = CoursePartitions(self._open_partition)
+            default_partition = self.partitions.get(None)
+            self.vector_store = default_partition.vector_store
+            self.lexical_index = default_partition.lexical_index
+            self.retriever = default_partition.retriever
+            
+            logger.info("Initializing text splitter...")
+            self.text_splitter = create_text_splitter()
             
-            print("Initializing ChatOpenAI...")
-            self.llm = ChatOpenAI(
+            logger.info("Initializing ChatOpenAI...")
+            self.llm = llm or ChatOpenAI(
                 temperature=0.7,
                 model_name="gpt-4",
                 openai_api_key=self.api_key,
                 request_timeout=60,  # Increase timeout for LLM requests
                 max_retries=3  # Add retries for reliability
             )
+            # Rewriting a follow-up into a standalone question does not need GPT-4
+            self.condense_llm = condense_llm or (llm if llm is not None else ChatOpenAI(
+                temperature=0,
+                model_name=CONDENSE_MODEL,
+                openai_api_key=self.api_key,
+                request_timeout=30,
+                max_retries=3
+            ))
             
-            print("Initializing conversation memory...")
-            self.memory = ConversationBufferMemory(
-                memory_key="chat_history",
-                return_messages=True,
-                output_key="answer"
+            logger.info("Initializing conversation memory...")
+            # Per-session windowed history; the chain itself is stateless
+            self.sessions = SessionMemoryStore(
+                max_sessions=SESSION_MAX_SESSIONS,
+                max_turns=SESSION_MAX_TURNS,
+                ttl_seconds=SESSION_TTL_SECONDS
             )
             
-            print("Initializing QA chain...")
-            # Create retriever with search kwargs
-            retriever = self.vector_store.as_retriever(
-                search_type="similarity",
-                search_kwargs={
-                    "k": 3
-                }
+            self.answer_cache = SemanticAnswerCache(
+                threshold=ANSWER_CACHE_THRESHOLD,
+                max_entries=ANSWER_CACHE_MAX_ENTRIES,
+                ttl_seconds=ANSWER_CACHE_TTL_SECONDS
             )
-            
+            # Concurrent identical questions share one upstream LLM call
+            self.query_flight = SingleFlight("rag_query")
+
+            # Which chunks (by content hash) each document owns in the indexes
+            self.registry = DocumentRegistry(document_registry_path)
+            self._document_locks: Dict[str, threading.Lock] = {}
+            self._document_locks_guard = threading.Lock()
+
+            logger.info("Initializing QA chain...")
+            # query and stream_query run the chain's condense, retrieve and answer
+            # steps one by one, each under its dependency's circuit breaker
             self.qa_chain = ConversationalRetrievalChain.from_llm(
                 llm=self.llm,
-                retriever=retriever,
-                memory=self.memory,
+                retriever=self.retriever,
+                condense_question_llm=self.condense_llm,
                 return_source_documents=True,
-                verbose=True
+                verbose=False
             )
+            # Condensing and answering are both LLM calls; tag them so metrics tell them apart
+            self.qa_chain.question_generator.tags = ["stage:condense_question"]
+            self.qa_chain.combine_docs_chain.tags = ["stage:generate_answer"]
+            self.run_config = {"callbacks": [stage_timing_callback]}
             
-            # Initialize thread pool for blocking operations
-            self.executor = ThreadPoolExecutor(max_workers=3)
+            # Separate pools so slow LLM calls never starve vector search
+            self.llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS, thread_name_prefix="rag-llm")
+            self.search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="rag-search")
+            # Ingestion has no timeout: its duration grows with the document
+            self.ingest_executor = ThreadPoolExecutor(max_workers=INGEST_MAX_WORKERS, thread_name_prefix="rag-ingest")
             
-            print("RAGService initialization complete!")
+            logger.info("RAGService initialization complete!")
             
         except Exception as e:
-            print(f"Error initializing RAGService: {str(e)}")
-            print(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Error initializing RAGService: %s", e)
             raise
 
-    def _detect_encoding(self, file_path: str) -> str:
-        """Detect the encoding of a file."""
-        with open(file_path, 'rb') as file:
-            raw_data = file.read()
-            result = chardet.detect(raw_data)
-            return result['encoding'] or 'utf-8'
-
-    def _load_text_file(self, file_path: str) -> List[Any]:
-        """Load a text file with proper encoding detection."""
-        try:
-            encoding = self._detect_encoding(file_path)
-            loader = TextLoader(file_path, encoding=encoding)
-            return loader.load()
-        except Exception as e:
-            print(f"Error loading text file: {str(e)}")
-            raise
+    def _open_partition(self, course_code: Optional[str]) -> IndexPartition:
+        """Open (creating on first use) the stores holding one course's chunks."""
+        vector_store = create_vector_store(
+            VECTOR_BACKEND,
+            self.embeddings,
+            persist_directory=self.vector_store_dir,
+            dtype=NUMPY_INDEX_DTYPE,
+            course_code=course_code
+        )
+        lexical_index = BM25Index(partition_path(self.lexical_index_path, course_code))
+        if RETRIEVAL_MODE == "hybrid":
+            # Fuse BM25 and vector rankings so exact terms are found with a small k
+            retriever = HybridRetriever(
+                vector_store=vector_store,
+                lexical_index=lexical_index,
+                k=RETRIEVAL_K,
+                fetch_k=HYBRID_FETCH_K,
+                rerank=RERANK_ENABLED,
+                mmr_lambda=MMR_LAMBDA
+            )
+        else:
+            retriever = VectorRetriever(
+                vector_store=vector_store,
+                k=RETRIEVAL_K,
+                fetch_k=HYBRID_FETCH_K,
+                rerank=RERANK_ENABLED,
+                mmr_lambda=MMR_LAMBDA
+            )
+        return IndexPartition(course_code, vector_store, lexical_index, retriever)
 
     def _load_document(self, file_path: str) -> List[Any]:
         try:
-            file_extension = os.path.splitext(file_path)[1].lower()
-            
-            if file_extension == '.txt':
-                documents = self._load_text_file(file_path)
-            else:
-                loaders = {
-                    '.pdf': PDFLoader,
-                    '.docx': DocxLoader,
-                }
-                
-                loader_class = loaders.get(file_extension, UnstructuredFileLoader)
-                loader = loader_class(file_path)
-                documents = loader.load()
+            with track_stage("document_load"):
+                documents = load_documents(file_path)
             
             # Split documents into chunks
-            chunks = self.text_splitter.split_documents(documents)
+            with track_stage("split"):
+                chunks = self.text_splitter.split_documents(documents)
+            record_items("split", len(chunks))
             
-            print(f"Loaded {len(documents)} documents, split into {len(chunks)} chunks")
+            logger.debug("Loaded %d documents, split into %d chunks", len(documents), len(chunks))
             return chunks
         except Exception as e:
-            print(f"Error loading document: {str(e)}")
+            logger.error("Error loading document: %s", e)
             raise
 
-    async def add_document(self, file_path: str) -> Dict[str, Any]:
+    def _iter_chunk_batches(self, file_path: str, batch_size: int) -> Iterator[List[Document]]:
+        """Split a lazily parsed file into chunk batches, holding at most one batch in memory."""
+        batch = []
+        for page in iter_documents(file_path):
+            with track_stage("split"):
+                page_chunks = self.text_splitter.split_documents([page])
+            record_items("split", len(page_chunks))
+            for chunk in page_chunks:
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _index_chunks(self, chunks: List[Any], partition: IndexPartition) -> List[str]:
+        """Write chunks to a partition's vector store and lexical index under shared ids."""
+        ids = [uuid.uuid4().hex for _ in chunks]
+        for chunk_id, chunk in zip(ids, chunks):
+            chunk.metadata["chunk_id"] = chunk_id
+        with track_stage("vector_write"):
+            partition.vector_store.add_documents(chunks, ids=ids)
+        with track_stage("lexical_write"):
+            partition.lexical_index.add(
+                ids,
+                [chunk.page_content for chunk in chunks],
+                [chunk.metadata for chunk in chunks]
+            )
+        return ids
+
+    def _document_lock(self, document_id: str) -> threading.Lock:
+        """Serialize ingestion of the same document so manifests don't interleave."""
+        with self._document_locks_guard:
+            return self._document_locks.setdefault(document_id, threading.Lock())
+
+    def ingest_document(self, file_path: str,
+                        progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+                        document_id: Optional[str] = None, source: Optional[str] = None,
+                        course_code: Optional[str] = None) -> Dict[str, Any]:
+        """Parse, split, embed and store a document. Blocking; run it off the event loop.
+
+        Re-ingesting a document id only embeds and writes chunks whose content
+        hash is new; chunks that disappeared are deleted and unchanged ones
+        are left in place. A course code (validated with normalize_course_code)
+        stores the document in that course's partition. The id defaults to
+        the file name prefixed with the course code (default_document_id), so
+        same-named files in different courses stay separate; re-ingesting an
+        explicit id under another course moves that document.
+
+        Files of STREAMING_INGEST_MIN_BYTES or more are streamed: parsed page
+        by page and written in bounded batches, so memory stays flat but the
+        total chunk count is only known at the end (reported as None).
+        """
         try:
             if not os.path.exists(file_path):
                 return {
                     "status": "error",
                     "message": f"File not found: {file_path}"
                 }
-                
-            documents = self._load_document(file_path)
-            if not documents:
+
+            source = source or os.path.basename(file_path)
+            document_id = document_id or default_document_id(source, course_code)
+
+            with self._document_lock(document_id):
+                return self._ingest_locked(file_path, progress_callback, document_id, source, course_code)
+        except Exception as e:
+            logger.exception("Error processing document: %s", e)
+            return {
+                "status": "error",
+                "message": f"Error processing document: {str(e)}"
+            }
+
+    def _ingest_locked(self, file_path: str, progress_callback: Optional[Callable[[int, Optional[int]], None]],
+                       document_id: str, source: str, course_code: Optional[str]) -> Dict[str, Any]:
+        if os.path.getsize(file_path) >= STREAMING_INGEST_MIN_BYTES:
+            return self._index_document(
+                self._iter_chunk_batches(file_path, INGEST_BATCH_SIZE), None,
+                document_id, source, progress_callback, course_code
+            )
+
+        documents = self._load_document(file_path)
+        return self._index_document(
+            self._batched(documents, INGEST_BATCH_SIZE), len(documents),
+            document_id, source, progress_callback, course_code
+        )
+
+    @staticmethod
+    def _batched(chunks: List[Document], batch_size: int) -> Iterator[List[Document]]:
+        return (chunks[start:start + batch_size] for start in range(0, len(chunks), batch_size))
+
+    def ingest_chunks(self, chunks: List[Document], document_id: str, source: str,
+                      batch_size: int = INGEST_BATCH_SIZE,
+                      progress_callback: Optional[Callable[[int, Optional[int]], None]] = None,
+                      course_code: Optional[str] = None) -> Dict[str, Any]:
+        """Index already parsed and split chunks as one document (see ingest_document)."""
+        try:
+            with self._document_lock(document_id):
+                return self._index_document(
+                    self._batched(chunks, batch_size), len(chunks), document_id, source, progress_callback,
+                    course_code
+                )
+        except Exception as e:
+            logger.exception("Error processing document: %s", e)
+            return {
+                "status": "error",
+                "message": f"Error processing document: {str(e)}"
+            }
+
+    def _index_document(self, batches: Iterator[List[Document]], total: Optional[int], document_id: str,
+                        source: str, progress_callback: Optional[Callable[[int, Optional[int]], None]],
+                        course_code: Optional[str] = None) -> Dict[str, Any]:
+        """Write a document's chunk batches, skipping unchanged chunks and deleting stale ones."""
+        if progress_callback:
+            progress_callback(0, total)
+
+        previous = self.registry.get_document(document_id)
+        if previous and previous["course_code"] != course_code:
+            # The document moved to another course: its chunks leave the old partition
+            self._purge_document(document_id)
+        partition = self.partitions.get(course_code)
+
+        existing = self.registry.get_chunks(document_id)
+        seen = set()
+        processed = added = removed = 0
+
+        # Write in batches so callers can follow progress
+        try:
+            for batch in batches:
+                new_chunks = []
+                for chunk in batch:
+                    content_hash = hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest()
+                    if content_hash in seen:
+                        continue
+                    seen.add(content_hash)
+                    if content_hash not in existing:
+                        chunk.metadata["source"] = source
+                        chunk.metadata["document_id"] = document_id
+                        if course_code is not None:
+                            chunk.metadata["course_code"] = course_code
+                        new_chunks.append((content_hash, chunk))
+
+                if new_chunks:
+                    ids = self._index_chunks([chunk for _, chunk in new_chunks], partition)
+                    # Record ownership right away so an interrupted run leaves no orphans
+                    self.registry.add_chunks(
+                        document_id, source, [(content_hash, i) for (content_hash, _), i in zip(new_chunks, ids)],
+                        course_code=course_code
+                    )
+                    added += len(new_chunks)
+
+                processed += len(batch)
+                if progress_callback:
+                    progress_callback(processed, total)
+
+            if not processed:
                 return {
                     "status": "error",
                     "message": "No content could be extracted from the document"
                 }
-                
-            self.vector_store.add_documents(documents)
-            
+
+            stale = {content_hash: i for content_hash, i in existing.items() if content_hash not in seen}
+            if stale:
+                partition.vector_store.delete(list(stale.values()))
+                partition.lexical_index.delete(list(stale.values()))
+                self.registry.remove_chunks(document_id, list(stale.keys()))
+                removed = len(stale)
+            self.registry.finalize(document_id)
+        finally:
+            if added or removed:
+                # Cached answers may be stale once the course's corpus changes
+                self.answer_cache.invalidate_scope(course_code)
+
+        if progress_callback and total is None:
+            progress_callback(processed, processed)
+
+        return {
+            "status": "success",
+            "message": f"Successfully added document: {source}",
+            "document_id": document_id,
+            "course_code": course_code,
+            "num_chunks": len(seen),
+            "added_chunks": added,
+            "unchanged_chunks": len(seen) - added,
+            "removed_chunks": removed
+        }
+
+    async def add_document(self, file_path: str, document_id: Optional[str] = None,
+                           source: Optional[str] = None, course_code: Optional[str] = None) -> Dict[str, Any]:
+        """Ingest a document on the ingestion pool without blocking the event loop."""
+        return await self._run_in_executor(
+            functools.partial(
+                self.ingest_document, file_path, document_id=document_id, source=source, course_code=course_code
+            ),
+            executor=self.ingest_executor, timeout=None
+        )
+
+    def _purge_document(self, document_id: str) -> Optional[int]:
+        """Remove a document's chunks from its partition; None if it is unknown.
+
+        The caller holds the document lock.
+        """
+        document = self.registry.get_document(document_id)
+        if not document:
+            return None
+        vector_ids = self.registry.delete_document(document_id)
+        if vector_ids:
+            partition = self.partitions.get(document["course_code"])
+            partition.vector_store.delete(vector_ids)
+            partition.lexical_index.delete(vector_ids)
+        self.answer_cache.invalidate_scope(document["course_code"])
+        return len(vector_ids)
+
+    def _delete_document(self, document_id: str) -> Dict[str, Any]:
+        with self._document_lock(document_id):
+            removed = self._purge_document(document_id)
+            if removed is None:
+                return {
+                    "status": "error",
+                    "message": f"Document not found: {document_id}"
+                }
             return {
                 "status": "success",
-                "message": f"Successfully added document: {os.path.basename(file_path)}",
-                "num_chunks": len(documents)
+                "message": f"Deleted document: {document_id}",
+                "removed_chunks": removed
             }
+
+    async def delete_document(self, document_id: str) -> Dict[str, Any]:
+        """Remove a document and all of its chunks from the indexes."""
+        try:
+            return await self._run_in_executor(
+                self._delete_document, document_id, executor=self.ingest_executor, timeout=None
+            )
         except Exception as e:
-            print(f"Error processing document: {str(e)}")
+            logger.exception("Error deleting document: %s", e)
             return {
                 "status": "error",
-                "message": f"Error processing document: {str(e)}"
+                "message": f"Error deleting document: {str(e)}"
             }
 
-    async def _run_in_executor(self, func, *args):
-        """Run a blocking function in the thread pool with timeout."""
+    async def _run_in_executor(self, func, *args, executor: Optional[ThreadPoolExecutor] = None,
+                               timeout: Optional[float] = LLM_TIMEOUT_SECONDS):
+        """Run a blocking function in a thread pool with timeout (LLM pool by default)."""
         loop = asyncio.get_event_loop()
+        # Carry the request context (metrics endpoint label) into the worker thread
+        context = contextvars.copy_context()
         try:
             return await asyncio.wait_for(
-                loop.run_in_executor(self.executor, 
-                    lambda: func(*args) if not isinstance(func, functools.partial) else func()),
-                timeout=60.0  # Increase timeout to 60 seconds
+                loop.run_in_executor(executor or self.llm_executor, context.run, functools.partial(func, *args)),
+                timeout=timeout
             )
         except asyncio.TimeoutError:
-            print(f"Operation timed out: {func.__name__ if hasattr(func, '__name__') else str(func)}")
+            logger.warning("Operation timed out: %s", getattr(func, "__name__", func))
             raise
         except Exception as e:
-            print(f"Error in executor: {str(e)}")
+            logger.error("Error in executor: %s", e)
             raise
 
-    async def query(self, message: str, context: Dict = None) -> Dict[str, Any]:
-        try:
-            print(f"Received query request: {{'message': {message}, 'context': {context}}}")
-            print(f"Processing query: {message}")
-            print(f"Context: {context}")
-            
-            # Get relevant documents
+    async def _run_search(self, func, *args):
+        """Run a blocking embedding or vector search call on the search pool."""
+        return await self._run_in_executor(
+            func, *args, executor=self.search_executor, timeout=SEARCH_TIMEOUT_SECONDS
+        )
+
+    def _get_chat_history(self, context: Optional[Dict], session_id: Optional[str]) -> List[Tuple[str, str]]:
+        """Chat history for a request: the session's window, else the client's (see parse_chat_history).
+
+        The client's history also covers sessions the server no longer holds,
+        e.g. after a restart or once they expired.
+        """
+        if session_id:
+            history = self.sessions.get_history(session_id)
+            if history:
+                return history
+        if context is not None and not isinstance(context, dict):
+            raise ValueError("context must be an object")
+        return parse_chat_history((context or {}).get("chat_history"))
+
+    def _with_recent_turns(self, message: str, chat_history: List[Any]) -> str:
+        """The follow-up prefixed with the latest turns, used instead of a condensed question."""
+        recent = _get_chat_history(chat_history[-RECENT_TURNS:]).strip()[-RECENT_TURNS_MAX_CHARS:]
+        return f"Recent conversation:\n{recent}\nFollow Up Input: {message}"
+
+    def _fallback_prompt(self, message: str) -> str:
+        """Prompt for answering without documents when retrieval fails."""
+        return f"""{self.system_prompt}
+
+Câu hỏi: {message}
+
+Hãy trả lời câu hỏi trên với vai trò là trợ lý AI của EduSmart."""
+
+    async def _guarded(self, dependency: str, func: Callable, *args,
+                       executor: Optional[ThreadPoolExecutor] = None) -> Any:
+        """Run a blocking call under the dependency's circuit breaker and adaptive timeout.
+
+        Fails immediately with CircuitOpenError while the circuit is open.
+        """
+        return await self.breakers[dependency].call_async(
+            lambda: self._run_in_executor(func, *args, executor=executor, timeout=None)
+        )
+
+    async def _standalone_question(self, message: str, chat_history: List[Any],
+                                   condense_mode: Optional[str]) -> str:
+        """The question to retrieve and answer with.
+
+        First turns are used as they are. Follow-ups are condensed with the
+        condense model, or prefixed with the latest turns in "recent_turns"
+        mode; the latter is also the fallback when condensing fails.
+        """
+        if not chat_history:
+            return message
+        if (condense_mode or CONDENSE_MODE) == "condense":
             try:
-                print("Searching for relevant documents...")
-                result = await self._run_in_executor(
-                    lambda: self.qa_chain.invoke({"question": message, "chat_history": context.get("chat_history", [])})
+                condensed = await self._guarded(
+                    "chat_model",
+                    lambda: self.qa_chain.question_generator.invoke({
+                        "question": message,
+                        "chat_history": _get_chat_history(chat_history)
+                    }, config=self.run_config)
                 )
-                print("Document search completed successfully")
-                
-                return {
-                    "status": "success",
-                    "answer": result["answer"],
-                    "sources": [
-                        {"content": doc.page_content, "metadata": doc.metadata}
-                        for doc in result.get("source_documents", [])
-                    ]
-                }
+                return condensed["text"]
             except Exception as e:
-                print(f"Document search failed: {str(e)}")
-                # Fallback to direct LLM if document search fails
-                print("Using LLM for response...")
-                formatted_message = f"""{self.system_prompt}
+                logger.warning("Condensing the question failed, using recent turns instead: %s", e)
+        return self._with_recent_turns(message, chat_history)
 
-Câu hỏi: {message}
+    async def _retrieve(self, question: str, retrieval: Optional[Dict[str, Any]] = None,
+                        course_code: Optional[str] = None) -> List[Document]:
+        """Search the course's partition, or the default one without a course."""
+        def search() -> List[Document]:
+            if course_code is not None and not self.registry.has_course(course_code):
+                # Nothing was uploaded for the course; don't create an empty partition
+                return []
+            return self._retriever_for(retrieval, course_code).invoke(question, config=self.run_config)
 
-Hãy trả lời câu hỏi trên với vai trò là trợ lý AI của EduSmart."""
+        return await self._guarded("vector_store", search, executor=self.search_executor)
+
+    def _retriever_for(self, retrieval: Optional[Dict[str, Any]], course_code: Optional[str] = None):
+        """The partition's shared retriever, or a copy carrying per-request overrides."""
+        retriever = self.partitions.get(course_code).retriever
+        if not retrieval:
+            return retriever
+        return retriever.model_copy(update=retrieval)
+
+    async def _lookup_cached_answer(self, message: str, chat_history: List[Any],
+                                    retrieval: Optional[Dict[str, Any]] = None,
+                                    course_code: Optional[str] = None) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """Embed a standalone question and look it up in the course's answer cache scope.
 
+        Follow-up questions depend on the conversation, and answers built with
+        per-request retrieval overrides depend on them, so neither is cached.
+        Returns the question vector (None when caching does not apply) and the hit.
+        """
+        if not ANSWER_CACHE_ENABLED or chat_history or retrieval:
+            return None, None
+        try:
+            vector = await self._run_in_executor(
+                self.embeddings.embed_query, message,
+                executor=self.search_executor, timeout=self.breakers["embeddings"].timeout()
+            )
+        except Exception as e:
+            # The embedding call runs under its breaker, which records how it ends; on a
+            # timeout here it keeps running, so recording a failure too would count it twice
+            logger.warning("Answer cache lookup failed: %s", e)
+            return None, None
+        return vector, self.answer_cache.lookup(vector, scope=course_code)
+
+    async def query(self, message: str, context: Dict = None, session_id: Optional[str] = None,
+                    retrieval: Optional[Dict[str, Any]] = None, condense_mode: Optional[str] = None,
+                    course_code: Optional[str] = None) -> Dict[str, Any]:
+        """Answer a question: condense it if needed, retrieve context, then answer.
+
+        `retrieval` holds per-request overrides from parse_retrieval_options;
+        `condense_mode` overrides CONDENSE_MODE for follow-up questions;
+        `course_code` limits the search to that course's documents.
+        """
+        try:
+            logger.debug("Processing query: %s (context: %s)", message, context)
+            
+            chat_history = self._get_chat_history(context, session_id)
+            question_vector, cached = await self._lookup_cached_answer(message, chat_history, retrieval, course_code)
+            if cached:
+                logger.debug("Answer cache hit (similarity %.3f)", cached["similarity"])
+                if session_id:
+                    self.sessions.append_turn(session_id, message, cached["answer"])
+                return {
+                    "status": "success",
+                    "answer": cached["answer"],
+                    "sources": cached["sources"]
+                }
+
+            async def answer_question() -> Tuple[str, List[Dict[str, Any]]]:
+                question = await self._standalone_question(message, chat_history, condense_mode)
+                # Read before retrieving: an answer from documents replaced meanwhile is not cached
+                generation = self.answer_cache.generation(course_code)
                 try:
-                    chat_response = await self._run_in_executor(
-                        lambda: self.llm.invoke(formatted_message).content
+                    docs = await self._retrieve(question, retrieval, course_code)
+                except Exception as e:
+                    # Fallback to direct LLM if document search fails
+                    logger.warning("Document search failed, answering with the LLM directly: %s", e)
+                    answer = await self._guarded(
+                        "chat_model",
+                        lambda: self.llm.invoke(self._fallback_prompt(message), config=self.run_config).content
+                    )
+                    return answer, []
+
+                result = await self._guarded(
+                    "chat_model",
+                    lambda: self.qa_chain.combine_docs_chain.invoke(
+                        {"input_documents": docs, "question": question},
+                        config=self.run_config
                     )
-                    return {
-                        "status": "success",
-                        "answer": chat_response,
-                        "sources": []
-                    }
-                except Exception as llm_error:
-                    print(f"LLM fallback failed: {str(llm_error)}")
-                    return {
-                        "status": "error",
-                        "message": "Xin lỗi, tôi đang gặp khó khăn trong việc xử lý câu hỏi của bạn. Vui lòng thử lại sau một lát."
-                    }
+                )
+                sources = [
+                    {"content": doc.page_content, "metadata": doc.metadata}
+                    for doc in docs
+                ]
+                if question_vector is not None:
+                    self.answer_cache.store(message, question_vector, result["output_text"], sources,
+                                            scope=course_code, generation=generation)
+                return result["output_text"], sources
+
+            try:
+                # Identical questions asked at the same time share one run
+                answer, sources = await self.query_flight.do(
+                    flight_key("answer", normalize_prompt(message), chat_history, retrieval,
+                               condense_mode or CONDENSE_MODE, course_code),
+                    answer_question
+                )
+            except Exception as e:
+                # The chat model failed or its circuit is open; there is nothing left to fall back to
+                logger.error("Answering failed: %r", e)
+                return {
+                    "status": "error",
+                    "message": "Xin lỗi, tôi đang gặp khó khăn trong việc xử lý câu hỏi của bạn. Vui lòng thử lại sau một lát."
+                }
+
+            if session_id:
+                self.sessions.append_turn(session_id, message, answer)
+            
+            return {
+                "status": "success",
+                "answer": answer,
+                "sources": sources
+            }
                 
         except Exception as e:
-            print(f"Error processing query: {str(e)}")
+            logger.exception("Error processing query: %s", e)
             return {
                 "status": "error",
                 "message": f"Error processing query: {str(e)}"
             }
 
+    async def stream_query(self, message: str, context: Dict = None, session_id: Optional[str] = None,
+                           retrieval: Optional[Dict[str, Any]] = None,
+                           condense_mode: Optional[str] = None,
+                           course_code: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """Answer a question as a stream of (event, data) pairs.
+
+        Emits one "sources" event with the retrieved documents, then "token"
+        events as the answer is generated, and finally "done" (or "error").
+        Uses the same condense and answer prompts as query.
+        """
+        try:
+            chat_history = self._get_chat_history(context, session_id)
+        except ValueError as e:
+            yield "error", {"message": str(e)}
+            return
+
+        question_vector, cached = await self._lookup_cached_answer(message, chat_history, retrieval, course_code)
+        if cached:
+            if session_id:
+                self.sessions.append_turn(session_id, message, cached["answer"])
+            yield "sources", cached["sources"]
+            yield "token", cached["answer"]
+            yield "done", {"answer": cached["answer"]}
+            return
+
+        retrieval_ok = True
+        question = await self._standalone_question(message, chat_history, condense_mode)
+        generation = self.answer_cache.generation(course_code)
+        try:
+            docs = await self._retrieve(question, retrieval, course_code)
+            prompt = self.qa_chain.combine_docs_chain.llm_chain.prompt.format_prompt(
+                context="\n\n".join(doc.page_content for doc in docs),
+                question=question
+            )
+        except Exception as e:
+            logger.warning("Document search failed, answering with the LLM directly: %s", e)
+            # Fallback to direct LLM if document search fails
+            retrieval_ok = False
+            docs = []
+            prompt = self._fallback_prompt(message)
+
+        sources = [
+            {"content": doc.page_content, "metadata": doc.metadata}
+            for doc in docs
+        ]
+        yield "sources", sources
+
+        answer_parts = []
+        try:
+            stream = self.llm.astream(prompt, config={**self.run_config, "tags": ["stage:generate_answer"]})
+            async for chunk in self.breakers["chat_model"].stream_async(stream):
+                if chunk.content:
+                    answer_parts.append(chunk.content)
+                    yield "token", chunk.content
+        except Exception as e:
+            logger.error("Error streaming answer: %s", e)
+            yield "error", {"message": "Xin lỗi, tôi đang gặp khó khăn trong việc xử lý câu hỏi của bạn. Vui lòng thử lại sau một lát."}
+            return
+
+        answer = "".join(answer_parts)
+        if retrieval_ok and question_vector is not None:
+            self.answer_cache.store(message, question_vector, answer, sources, scope=course_code,
+                                    generation=generation)
+        if session_id:
+            self.sessions.append_turn(session_id, message, answer)
+        yield "done", {"answer": answer}
+
     async def _get_relevant_quotes(self, question: str) -> str:
         """Get relevant quotes from the vector store for the question."""
         try:
-            docs = await self._run_in_executor(
+            docs = await self._run_search(
                 functools.partial(self.vector_store.similarity_search, question, k=5)
             )
             if not docs:
@@ -277,12 +936,13 @@ Hãy trả lời câu hỏi trên với vai trò là trợ lý AI của EduSmart
             
             return "\n".join(quotes)
         except Exception as e:
-            print(f"Error getting relevant quotes: {e}")
+            logger.error("Error getting relevant quotes: %s", e)
             return "Lỗi khi tìm trích dẫn."
 
-    async def get_relevant_context(self, query: str) -> Dict[str, Any]:
+    async def get_relevant_context(self, query: str, retrieval: Optional[Dict[str, Any]] = None,
+                                   course_code: Optional[str] = None) -> Dict[str, Any]:
         try:
-            documents = self.vector_store.similarity_search(query, k=3)
+            documents = await self._retrieve(query, retrieval, course_code)
             contexts = []
             
             for doc in documents:
@@ -296,11 +956,23 @@ Hãy trả lời câu hỏi trên với vai trò là trợ lý AI của EduSmart
                 "contexts": contexts
             }
         except Exception as e:
-            print(f"Error retrieving context: {str(e)}")
+            logger.error("Error retrieving context: %s", e)
             return {
                 "status": "error",
                 "message": f"Error retrieving context: {str(e)}"
             }
 
+    def get_stats(self) -> Dict[str, Any]:
+        """Runtime statistics for the RAG pipeline."""
+        return {
+            "embedding_cache": self.embeddings.get_stats(),
+            "query_batching": self.query_embedder.get_stats(),
+            "sessions": self.sessions.get_stats(),
+            "answer_cache": self.answer_cache.get_stats(),
+            "single_flight": self.query_flight.get_stats(),
+            "circuit_breakers": {name: breaker.get_stats() for name, breaker in self.breakers.items()},
+            "course_partitions": {"open": len(self.partitions.open_courses())}
+        }
+
 # Create a singleton instance
 rag_service = RAGService() 
\ No newline at end of file
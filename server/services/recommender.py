@@ -0,0 +1,173 @@
+from typing import Any, Dict, List, Optional, Sequence
+import os
+import numpy as np
+from services.course_catalog import CatalogSnapshot, CourseCatalog
+from services.metrics import track_stage
+
+# Share of a course's score from skill tag similarity and from category affinity
+SKILL_WEIGHT = float(os.getenv("RECOMMENDER_SKILL_WEIGHT", "0.7"))
+CATEGORY_WEIGHT = float(os.getenv("RECOMMENDER_CATEGORY_WEIGHT", "0.3"))
+# Users scored per matrix product in batch mode, bounding the score matrix size
+BATCH_BLOCK_SIZE = int(os.getenv("RECOMMENDER_BATCH_BLOCK_SIZE", "1024"))
+
+
+class CourseMatrix:
+    """Feature matrix of a catalog snapshot: one row per course, one column per skill tag and category.
+
+    Skill columns hold the course's L2-normalized skill tag indicators scaled
+    by the skill weight; category columns hold the category weight in the
+    course's category. The dot product with a user vector from encode_user
+    is therefore the course's score.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot, skill_weight: float, category_weight: float):
+        self.snapshot = snapshot
+        self.skills = {skill: column for column, skill in enumerate(snapshot.by_skill)}
+        self.categories = {category: len(self.skills) + column for column, category in enumerate(snapshot.by_category)}
+        self.positions = {course.get("CourseCode"): position for position, course in enumerate(snapshot.courses)}
+
+        features = np.zeros((len(snapshot.courses), len(self.skills) + len(self.categories)), dtype=np.float32)
+        for skill, positions in snapshot.by_skill.items():
+            features[positions, self.skills[skill]] = 1.0
+        norms = np.linalg.norm(features[:, :len(self.skills)], axis=1, keepdims=True)
+        features[:, :len(self.skills)] *= skill_weight / np.maximum(norms, 1e-12)
+        for category, positions in snapshot.by_category.items():
+            features[positions, self.categories[category]] = category_weight
+        self.features = features
+
+    def encode_user(self, learning_status: Dict[str, Any]) -> np.ndarray:
+        """User vector: unit-length skill profile, and category shares summing to one.
+
+        Skills count once per completed course that taught them (skill_levels),
+        plus the skills of in-progress courses weighted by their progress.
+        Categories count each of the user's courses, completed ones fully and
+        in-progress ones by their progress, so partly followed interests still count.
+        """
+        # Summed per column in a dict first; scalar writes into the array cost far more
+        totals: Dict[int, float] = {}
+        for skill, count in learning_status["skill_levels"].items():
+            if skill in self.skills:
+                column = self.skills[skill]
+                totals[column] = totals.get(column, 0.0) + count
+
+        courses = [(course, 1.0) for course in learning_status["completed_courses"]]
+        courses += [(course, _progress_weight(course)) for course in learning_status["in_progress_courses"]]
+        for course, weight in courses:
+            if course.get("category") in self.categories:
+                column = self.categories[course["category"]]
+                totals[column] = totals.get(column, 0.0) + weight
+        for course, weight in courses[len(learning_status["completed_courses"]):]:
+            position = self.positions.get(course["course_id"])
+            if position is not None:
+                for skill in self.snapshot.courses[position].get("skillTags") or []:
+                    column = self.skills[skill]
+                    totals[column] = totals.get(column, 0.0) + weight
+
+        vector = np.zeros(self.features.shape[1], dtype=np.float32)
+        if totals:
+            vector[list(totals)] = list(totals.values())
+        num_skills = len(self.skills)
+        skill_norm = np.linalg.norm(vector[:num_skills])
+        if skill_norm:
+            vector[:num_skills] /= skill_norm
+        category_total = vector[num_skills:].sum()
+        if category_total:
+            vector[num_skills:] /= category_total
+        return vector
+
+    def excluded_positions(self, learning_status: Dict[str, Any]) -> List[int]:
+        """Catalog positions of the courses the user already takes or took."""
+        codes = [c["course_id"] for c in learning_status["completed_courses"] + learning_status["in_progress_courses"]]
+        return [self.positions[code] for code in codes if code in self.positions]
+
+
+def _progress_weight(course: Dict[str, Any]) -> float:
+    """Weight of an in-progress course: half for enrolling, the rest by progress."""
+    try:
+        progress = min(max(float(course.get("progress") or 0), 0.0), 100.0)
+    except (TypeError, ValueError):
+        progress = 0.0
+    return 0.5 + progress / 200
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k best scores in each row, best first; ties keep catalog order."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    kth = np.partition(scores, scores.shape[1] - k, axis=1)[:, scores.shape[1] - k:][:, :1]
+    # Everything above the k-th best score, then the earliest of the courses tied with it
+    above = scores > kth
+    tied = scores == kth
+    chosen = above | tied
+    need = k - above.sum(axis=1)
+    surplus = np.nonzero(tied.sum(axis=1) > need)[0]
+    if len(surplus):
+        # Only rows with more ties than free places pay for the running count
+        chosen[surplus] = above[surplus] | (tied[surplus] & (np.cumsum(tied[surplus], axis=1) <= need[surplus, None]))
+    candidates = np.nonzero(chosen)[1].reshape(scores.shape[0], k)
+    rows = np.arange(scores.shape[0])[:, None]
+    order = np.lexsort((candidates, -scores[rows, candidates]))
+    return candidates[rows, order]
+
+
+class CourseRecommender:
+    """Ranks the whole active catalog for a user with one matrix-vector product.
+
+    Works on the CourseCatalog snapshot and rebuilds its feature matrix only
+    when the snapshot changes. Returns None when the catalog has no fresh
+    snapshot, so callers can fall back to querying MongoDB.
+    """
+
+    def __init__(self, catalog: CourseCatalog, skill_weight: float = SKILL_WEIGHT,
+                 category_weight: float = CATEGORY_WEIGHT, block_size: int = BATCH_BLOCK_SIZE):
+        self.catalog = catalog
+        self.skill_weight = skill_weight
+        self.category_weight = category_weight
+        self.block_size = block_size
+        self._matrix: Optional[CourseMatrix] = None
+
+    def matrix(self) -> Optional[CourseMatrix]:
+        snapshot = self.catalog.snapshot()
+        if snapshot is None:
+            return None
+        matrix = self._matrix
+        if matrix is None or matrix.snapshot is not snapshot:
+            with track_stage("recommender_build"):
+                matrix = self._matrix = CourseMatrix(snapshot, self.skill_weight, self.category_weight)
+        return matrix
+
+    def recommend(self, learning_status: Dict[str, Any], k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Top-k active courses the user has not taken, each with its "score"."""
+        results = self.recommend_batch([learning_status], k)
+        return results[0] if results is not None else None
+
+    def recommend_batch(self, learning_statuses: Sequence[Dict[str, Any]],
+                        k: int = 5) -> Optional[List[List[Dict[str, Any]]]]:
+        """recommend() for many users at once, e.g. to precompute recommendations.
+
+        Users are encoded into one matrix and scored against the catalog
+        block_size users per matrix product.
+        """
+        matrix = self.matrix()
+        if matrix is None:
+            return None
+
+        results: List[List[Dict[str, Any]]] = []
+        with track_stage("recommender_score"):
+            for start in range(0, len(learning_statuses), self.block_size):
+                block = learning_statuses[start:start + self.block_size]
+                users = np.stack([matrix.encode_user(status) for status in block])
+                # Rounded so equal scores tie whatever order BLAS summed them in
+                scores = np.round(users @ matrix.features.T, 6)
+                excluded = [matrix.excluded_positions(status) for status in block]
+                rows = np.repeat(np.arange(len(block)), [len(positions) for positions in excluded])
+                scores[rows, [position for positions in excluded for position in positions]] = -np.inf
+                best = top_k(scores, k)
+                best_scores = np.take_along_axis(scores, best, axis=1)
+                for positions, values in zip(best.tolist(), best_scores.tolist()):
+                    results.append([
+                        {**matrix.snapshot.courses[position], "score": round(value, 4)}
+                        for position, value in zip(positions, values) if value != -np.inf
+                    ])
+        return results
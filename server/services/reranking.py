@@ -0,0 +1,117 @@
+from typing import Any, List, Optional
+import logging
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from services.metrics import track_stage
+
+logger = logging.getLogger(__name__)
+
+
+def mmr_select(vectors: np.ndarray, relevance: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """Greedy maximal marginal relevance over candidate vectors.
+
+    Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * (max similarity to those already picked),
+    updating the running max-similarity vector in place. Returns candidate indices.
+    """
+    n = len(vectors)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = unit @ unit.T
+
+    first = int(np.argmax(relevance))
+    selected = [first]
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+    max_similarity = similarity[first].copy()
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+
+def stored_vectors(vector_store: VectorStore, docs: List[Document]) -> Optional[np.ndarray]:
+    """Embeddings already stored for the documents, or None if any is unavailable.
+
+    Documents are looked up by their chunk id, so nothing is re-embedded.
+    """
+    ids = [doc.metadata.get("chunk_id") for doc in docs]
+    if not ids or None in ids:
+        return None
+
+    if hasattr(vector_store, "get_vectors"):
+        try:
+            return vector_store.get_vectors(ids)
+        except KeyError:
+            return None
+
+    collection = getattr(vector_store, "_collection", None)
+    if collection is None:
+        return None
+    result = collection.get(ids=ids, include=["embeddings"])
+    by_id = dict(zip(result["ids"], result["embeddings"]))
+    if len(by_id) < len(set(ids)):
+        return None
+    return np.asarray([by_id[chunk_id] for chunk_id in ids], dtype=np.float32)
+
+
+def cosine_relevance(vectors: np.ndarray, query_vector: List[float]) -> np.ndarray:
+    """Cosine similarity of each candidate vector to the query vector."""
+    query = np.asarray(query_vector, dtype=np.float32)
+    norms = np.maximum(np.linalg.norm(vectors, axis=1) * np.linalg.norm(query), 1e-12)
+    return (vectors @ query) / norms
+
+
+def rerank_mmr(vector_store: VectorStore, candidates: List[Document], k: int, lambda_mult: float,
+               relevance: Optional[np.ndarray] = None, query_vector: Optional[List[float]] = None) -> List[Document]:
+    """Diverse top-k of ranked candidates; keeps the ranking order if vectors are missing.
+
+    Relevance is the cosine similarity to `query_vector` when given,
+    otherwise the `relevance` scores of the candidates.
+    """
+    if len(candidates) <= 1:
+        return candidates[:k]
+    with track_stage("rerank"):
+        try:
+            vectors = stored_vectors(vector_store, candidates)
+        except Exception as e:
+            logger.warning("Could not read stored vectors, skipping re-ranking: %s", e)
+            vectors = None
+        if vectors is None:
+            return candidates[:k]
+        if query_vector is not None:
+            relevance = cosine_relevance(vectors, query_vector)
+        return [candidates[i] for i in mmr_select(vectors, relevance, k, lambda_mult)]
+
+
+class VectorRetriever(BaseRetriever):
+    """Similarity search with optional MMR re-ranking of a larger candidate set."""
+
+    vector_store: VectorStore
+    k: int = 3
+    fetch_k: int = 20
+    rerank: bool = False
+    mmr_lambda: float = 0.5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                **kwargs: Any) -> List[Document]:
+        if not self.rerank:
+            with track_stage("vector_search"):
+                return self.vector_store.similarity_search(query, k=self.k)
+
+        # Embedded once (usually a hit in the query vector cache) for both the search
+        # and the candidates' cosine relevance, so lambda weighs true similarity
+        query_vector = self.vector_store.embeddings.embed_query(query)
+        with track_stage("vector_search"):
+            candidates = self.vector_store.similarity_search_by_vector(query_vector, k=self.fetch_k)
+        return rerank_mmr(self.vector_store, candidates, self.k, self.mmr_lambda, query_vector=query_vector)
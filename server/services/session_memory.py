@@ -0,0 +1,78 @@
+from typing import Dict, Any, List, Tuple
+import time
+import threading
+from collections import OrderedDict, deque
+
+
+class _Session:
+    def __init__(self, max_turns: int):
+        self.turns = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+
+
+class SessionMemoryStore:
+    """Bounded per-session conversation memory.
+
+    Each session keeps a window of its last `max_turns` (question, answer)
+    pairs. Sessions are evicted least-recently-used once `max_sessions` is
+    reached, and expire after `ttl_seconds` without activity.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_turns: int = 5, ttl_seconds: float = 3600):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.evictions = 0
+        self.expirations = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        # Sessions are kept in access order, so expired ones sit at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self.expirations += 1
+
+    def get_history(self, session_id: str) -> List[Tuple[str, str]]:
+        """Return the session's recent turns as (question, answer) pairs."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if not session:
+                return []
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            return list(session.turns)
+
+    def append_turn(self, session_id: str, question: str, answer: str):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if not session:
+                session = self._sessions[session_id] = _Session(self.max_turns)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            session.turns.append((question, answer))
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+
+    def clear(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "max_turns": self.max_turns,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
@@ -0,0 +1,68 @@
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+import re
+import json
+import asyncio
+import hashlib
+import unicodedata
+from services.metrics import SINGLE_FLIGHT_CALLS
+
+T = TypeVar("T")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Canonical form of a prompt for deduplication: NFC, case-folded, single-spaced."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text).casefold()).strip()
+
+
+def flight_key(*parts: Any) -> str:
+    """Stable hash of the inputs that determine an upstream call's result."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one upstream call.
+
+    The first caller starts the call as a task; callers arriving while it is
+    in flight await the same task and share its result or exception. The
+    task is shielded, so a caller that disconnects does not cancel it for
+    the others. Keys are forgotten as soon as the call finishes, so nothing
+    is cached beyond the in-flight window.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            SINGLE_FLIGHT_CALLS.labels(self.name, "executed").inc()
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.collapsed += 1
+            SINGLE_FLIGHT_CALLS.labels(self.name, "collapsed").inc()
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.calls + self.collapsed
+        return {
+            "upstream_calls": self.calls,
+            "collapsed_calls": self.collapsed,
+            "in_flight": len(self._inflight),
+            "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+        }
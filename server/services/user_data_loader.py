@@ -0,0 +1,130 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+import asyncio
+from services.metrics import track_stage
+
+
+def learning_profile_pipeline(user_code: str) -> List[Dict[str, Any]]:
+    """UserProgress aggregation computing a user's learning status on the server.
+
+    Joins each progress record to its course and projects only the fields
+    the learning status uses. A $facet then returns the per-course rows,
+    the total learning time with the categories, and the skill tag counts of
+    completed courses, all as one document. Progress on courses that do not
+    exist is skipped.
+    """
+    status = {"$toLower": {"$ifNull": ["$status", {"$ifNull": ["$Status", "in_progress"]}]}}
+    return [
+        {"$match": {"$or": [{"UserCode": user_code}, {"userId": user_code}]}},
+        {"$lookup": {"from": "Course", "localField": "CourseCode", "foreignField": "CourseCode", "as": "course"}},
+        {"$set": {"course": {"$arrayElemAt": ["$course", 0]}}},
+        {"$match": {"course": {"$exists": True}}},
+        {"$project": {
+            "_id": 0,
+            "course_id": "$CourseCode",
+            "title": "$course.Name",
+            "category": {"$ifNull": ["$course.category", "Unknown"]},
+            "progress": {"$ifNull": ["$progress", {"$ifNull": ["$Progress", 0]}]},
+            "time_spent": {"$ifNull": ["$timeSpent", {"$ifNull": ["$TimeSpent", 0]}]},
+            "last_accessed": {"$ifNull": ["$lastAccessed", {"$ifNull": ["$LastAccessed", None]}]},
+            "completed": {"$eq": [status, "completed"]},
+            "course_category": "$course.category",
+            "skill_tags": "$course.skillTags",
+        }},
+        {"$facet": {
+            "courses": [{"$project": {"course_category": 0, "skill_tags": 0}}],
+            "totals": [{"$group": {
+                "_id": None,
+                "total_learning_time": {"$sum": "$time_spent"},
+                "categories": {"$addToSet": "$course_category"},
+            }}],
+            "skills": [
+                {"$match": {"completed": True}},
+                {"$unwind": "$skill_tags"},
+                {"$group": {"_id": "$skill_tags", "count": {"$sum": 1}}},
+            ],
+        }},
+    ]
+
+
+class UserDataLoader:
+    """Request-scoped loader for the Mongo reads behind the learning path endpoints.
+
+    Create one per request and pass it to every service method the request
+    calls. Each read is started once and shared by all callers as a task,
+    so concurrent callers wait on the same round trip instead of repeating
+    it, and the user and progress lookups go out together.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._loads: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    def load(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> "asyncio.Future[Any]":
+        """Start `factory()` the first time `key` is requested; later calls share its result."""
+        future = self._loads.get(key)
+        if future is None:
+            future = self._loads[key] = asyncio.ensure_future(factory())
+        return future
+
+    async def user(self, user_code: str) -> Optional[Dict[str, Any]]:
+        """The user with this UserCode, falling back to a userId match."""
+        return await self.load(("user", user_code), lambda: self._find_user(user_code))
+
+    async def _find_user(self, user_code: str) -> Optional[Dict[str, Any]]:
+        # Both identifiers in one round trip; a UserCode match still wins
+        with track_stage("mongo_find_user"):
+            users = await self.db.User.find({
+                "$or": [{"UserCode": user_code}, {"userId": user_code}]
+            }).to_list(length=None)
+        for user in users:
+            if user.get("UserCode") == user_code:
+                return user
+        return users[0] if users else None
+
+    async def progress(self, user_code: str) -> List[Dict[str, Any]]:
+        return await self.load(("progress", user_code), lambda: self._find_progress(user_code))
+
+    async def _find_progress(self, user_code: str) -> List[Dict[str, Any]]:
+        with track_stage("mongo_find_progress"):
+            return await self.db.UserProgress.find({
+                "$or": [
+                    {"UserCode": user_code},  # Changed to match database schema
+                    {"userId": user_code}
+                ]
+            }).to_list(length=None)
+
+    async def user_and_progress(self, user_code: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Both lookups, issued concurrently since neither depends on the other."""
+        user, progress = await asyncio.gather(self.user(user_code), self.progress(user_code))
+        return user, progress
+
+    async def learning_profile(self, user_code: str) -> Dict[str, Any]:
+        """Result of learning_profile_pipeline: {"courses", "totals", "skills"}."""
+        return await self.load(("learning_profile", user_code), lambda: self._aggregate_profile(user_code))
+
+    async def _aggregate_profile(self, user_code: str) -> Dict[str, Any]:
+        with track_stage("mongo_aggregate_profile"):
+            results = await self.db.UserProgress.aggregate(learning_profile_pipeline(user_code)).to_list(length=None)
+        return results[0] if results else {"courses": [], "totals": [], "skills": []}
+
+    async def courses(self, course_codes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Courses by CourseCode; codes loaded earlier in the request are not fetched again."""
+        codes = list(dict.fromkeys(course_codes))
+        missing = [code for code in codes if ("course", code) not in self._loads]
+        if missing:
+            batch = asyncio.ensure_future(self._find_courses(missing))
+            for code in missing:
+                self._loads[("course", code)] = batch
+        found: Dict[str, Dict[str, Any]] = {}
+        for code in codes:
+            course = (await self._loads[("course", code)]).get(code)
+            if course:
+                found[code] = course
+        return found
+
+    async def _find_courses(self, course_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        with track_stage("mongo_find_courses"):
+            courses = await self.db.Course.find({
+                "CourseCode": {"$in": course_codes}
+            }).to_list(length=None)
+        return {course["CourseCode"]: course for course in courses}
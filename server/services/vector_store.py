@@ -0,0 +1,281 @@
+from typing import List, Dict, Any, Optional, Iterable, Sequence, Tuple, Callable
+import os
+import json
+import uuid
+import sqlite3
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.chroma import Chroma
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+
+# Rows upcast at a time when scoring a float16 index
+FLOAT16_BLOCK_ROWS = 65536
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact in-process vector index backed by a memory-mapped NumPy matrix.
+
+    Embeddings are L2-normalized and stored row by row in `vectors.bin`
+    (float32 or float16); text, metadata and ids live in a SQLite side table
+    keyed by row number. A search is one matrix-vector product followed by
+    `argpartition`, so results are exact cosine top-k. Deleted rows are
+    masked out rather than compacted.
+    """
+
+    def __init__(self, embedding_function: Embeddings, persist_directory: str,
+                 dtype: str = "float32", initial_capacity: int = 1024):
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"Unsupported dtype for NumpyVectorStore: {dtype}")
+
+        self._embedding_function = embedding_function
+        self.persist_directory = persist_directory
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self._lock = threading.RLock()
+
+        os.makedirs(persist_directory, exist_ok=True)
+        self._vectors_path = os.path.join(persist_directory, "vectors.bin")
+        self._conn = sqlite3.connect(os.path.join(persist_directory, "index.sqlite"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, text TEXT NOT NULL, "
+            "metadata TEXT NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def _load(self):
+        settings = dict(self._conn.execute("SELECT key, value FROM settings").fetchall())
+        if settings.get("dtype", self.dtype.name) != self.dtype.name:
+            raise ValueError(
+                f"Index at {self.persist_directory} was built with {settings['dtype']}, not {self.dtype.name}"
+            )
+        self.dim: Optional[int] = int(settings["dim"]) if "dim" in settings else None
+
+        rows = self._conn.execute("SELECT row, id, deleted FROM chunks ORDER BY row").fetchall()
+        self._size = rows[-1][0] + 1 if rows else 0
+        self._ids: List[Optional[str]] = [None] * self._size
+        self._row_by_id: Dict[str, int] = {}
+
+        self._matrix: Optional[np.memmap] = None
+        capacity = 0
+        if self.dim is not None and os.path.exists(self._vectors_path):
+            capacity = os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize)
+            self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+        self._alive = np.zeros(max(self._size, capacity, self.initial_capacity), dtype=bool)
+        for row, chunk_id, deleted in rows:
+            self._ids[row] = chunk_id
+            if not deleted:
+                self._row_by_id[chunk_id] = row
+                self._alive[row] = True
+
+    def _ensure_capacity(self, needed: int):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(self.initial_capacity, capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+        # Growing the file keeps existing rows in place; re-map at the new size
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(new_capacity, self.dim))
+
+        if self._alive.shape[0] < new_capacity:
+            alive = np.zeros(new_capacity, dtype=bool)
+            alive[:self._alive.shape[0]] = self._alive
+            self._alive = alive
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, *,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = self._normalize(np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32))
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                    [("dim", str(self.dim)), ("dtype", self.dtype.name)]
+                )
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+            # Re-adding an existing id replaces it
+            self._delete_rows([self._row_by_id[i] for i in ids if i in self._row_by_id])
+
+            start = self._size
+            self._ensure_capacity(start + len(texts))
+            self._matrix[start:start + len(texts)] = vectors.astype(self.dtype)
+            self._matrix.flush()
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (row, id, text, metadata, deleted) VALUES (?, ?, ?, ?, 0)",
+                [
+                    (start + offset, chunk_id, text, json.dumps(metadata, ensure_ascii=False, default=str))
+                    for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                ]
+            )
+            self._conn.commit()
+
+            for offset, chunk_id in enumerate(ids):
+                self._ids.append(chunk_id)
+                self._row_by_id[chunk_id] = start + offset
+            self._alive[start:start + len(texts)] = True
+            self._size = start + len(texts)
+        return ids
+
+    def _delete_rows(self, rows: List[int]):
+        if not rows:
+            return
+        self._conn.executemany("UPDATE chunks SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+        self._conn.commit()
+        for row in rows:
+            self._alive[row] = False
+            self._row_by_id.pop(self._ids[row], None)
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            self._delete_rows([self._row_by_id[i] for i in ids if i in self._row_by_id])
+        return True
+
+    def _documents_for_rows(self, rows: Sequence[int]) -> List[Document]:
+        if not rows:
+            return []
+        placeholders = ",".join("?" * len(rows))
+        with self._lock:
+            records = self._conn.execute(
+                f"SELECT row, id, text, metadata FROM chunks WHERE row IN ({placeholders})", list(rows)
+            ).fetchall()
+        by_row = {
+            row: Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+            for row, chunk_id, text, metadata in records
+        }
+        return [by_row[row] for row in rows if row in by_row]
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        rows = [self._row_by_id[i] for i in ids if i in self._row_by_id]
+        return self._documents_for_rows(rows)
+
+    def get_vectors(self, ids: Sequence[str]) -> np.ndarray:
+        """Stored (normalized, float32) vectors for the given ids, in order."""
+        with self._lock:
+            rows = [self._row_by_id[i] for i in ids]
+            return np.asarray(self._matrix[rows], dtype=np.float32)
+
+    def _top_rows(self, embedding: List[float], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._matrix is None or not self._size:
+                return np.array([], dtype=int), np.array([], dtype=np.float32)
+            size = self._size
+            alive = self._alive[:size].copy()
+            matrix = self._matrix[:size]
+
+        query = self._normalize(np.asarray(embedding, dtype=np.float32))
+        if self.dtype == np.float32:
+            scores = matrix @ query
+        else:
+            # NumPy has no BLAS path for float16; upcast block by block
+            scores = np.empty(size, dtype=np.float32)
+            for start in range(0, size, FLOAT16_BLOCK_ROWS):
+                block = matrix[start:start + FLOAT16_BLOCK_ROWS]
+                scores[start:start + FLOAT16_BLOCK_ROWS] = block.astype(np.float32) @ query
+        scores = np.where(alive, scores, -np.inf)
+
+        k = min(k, int(alive.sum()))
+        if k <= 0:
+            return np.array([], dtype=int), np.array([], dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top, scores[top]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None,
+                                               **kwargs: Any) -> List[Tuple[Document, float]]:
+        if not filter:
+            rows, scores = self._top_rows(embedding, k)
+            return list(zip(self._documents_for_rows(rows.tolist()), scores.tolist()))
+
+        # Metadata lives on disk, so widen the candidate set until enough rows match
+        fetch_k = k * 4
+        while True:
+            rows, scores = self._top_rows(embedding, fetch_k)
+            matches = [
+                (doc, score)
+                for doc, score in zip(self._documents_for_rows(rows.tolist()), scores.tolist())
+                if all(doc.metadata.get(key) == value for key, value in filter.items())
+            ]
+            if len(matches) >= k or len(rows) < fetch_k:
+                return matches[:k]
+            fetch_k *= 4
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_score(embedding, k, **kwargs)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1) / 2
+
+    def count(self) -> int:
+        return int(self._alive[:self._size].sum())
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, *,
+                   ids: Optional[List[str]] = None, persist_directory: str = "./data/numpy_index",
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding_function=embedding, persist_directory=persist_directory, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+
+def create_vector_store(backend: str, embeddings: Embeddings, persist_directory: str,
+                        dtype: str = "float32", course_code: Optional[str] = None) -> VectorStore:
+    """Build the vector store selected by `backend` ("chroma" or "numpy").
+
+    A course code selects that course's partition: its own Chroma collection,
+    or its own NumPy index under `courses/` in the same directory.
+    """
+    if backend == "chroma":
+        if course_code is None:
+            return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+        return Chroma(collection_name=f"course_{course_code}", persist_directory=persist_directory,
+                      embedding_function=embeddings)
+    if backend == "numpy":
+        if course_code is not None:
+            persist_directory = os.path.join(persist_directory, "courses", course_code)
+        return NumpyVectorStore(embedding_function=embeddings, persist_directory=persist_directory, dtype=dtype)
+    raise ValueError(f"Unknown vector store backend: {backend}. Expected one of: {', '.join(VECTOR_BACKENDS)}")
@@ -0,0 +1,43 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Importing the RAG module builds its default singleton; keep it off the
+# real data directory and away from the network
+_scratch_dir = tempfile.mkdtemp(prefix="rag_tests_")
+os.environ.setdefault("OPENAI_API_KEY", "offline-tests")
+for _variable, _name in [
+    ("RAG_VECTOR_STORE_DIR", "default_vector_store"),
+    ("RAG_LEXICAL_INDEX_PATH", "default_lexical_index.sqlite"),
+    ("RAG_DOCUMENT_REGISTRY_PATH", "default_document_registry.sqlite"),
+    ("RAG_EMBEDDING_CACHE_PATH", "default_embedding_cache.sqlite"),
+]:
+    os.environ[_variable] = os.path.join(_scratch_dir, _name)
+
+from benchmarks.fakes import HashEmbeddings, FakeChatModel  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def scratch_dir():
+    yield _scratch_dir
+    shutil.rmtree(_scratch_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def rag(tmp_path):
+    """A RAGService on fake models and scratch storage."""
+    from services.ragService import RAGService
+
+    return RAGService(
+        embeddings=HashEmbeddings(dim=64),
+        llm=FakeChatModel(),
+        condense_llm=FakeChatModel(answer="Câu hỏi độc lập?"),
+        vector_store_dir=str(tmp_path / "vector_store"),
+        lexical_index_path=str(tmp_path / "lexical_index.sqlite"),
+        document_registry_path=str(tmp_path / "document_registry.sqlite"),
+        embedding_cache_path=str(tmp_path / "embedding_cache.sqlite"),
+    )
@@ -0,0 +1,51 @@
+import asyncio
+
+from services.answer_cache import SemanticAnswerCache
+
+VECTOR = [1.0, 0.0, 0.0]
+
+
+def test_store_after_invalidation_is_skipped():
+    cache = SemanticAnswerCache()
+    generation = cache.generation("IT3100")
+    cache.invalidate_scope("IT3100")
+
+    assert not cache.store("Câu hỏi?", VECTOR, "Câu trả lời cũ", [], scope="IT3100", generation=generation)
+    assert cache.lookup(VECTOR, scope="IT3100") is None
+    assert cache.get_stats()["stale_stores"] == 1
+
+
+def test_other_scopes_keep_their_generation():
+    cache = SemanticAnswerCache()
+    generation = cache.generation("MI1111")
+    cache.invalidate_scope("IT3100")
+
+    assert cache.store("Câu hỏi?", VECTOR, "Câu trả lời", [], scope="MI1111", generation=generation)
+    assert cache.lookup(VECTOR, scope="MI1111")["answer"] == "Câu trả lời"
+
+
+def test_full_invalidation_changes_every_generation():
+    cache = SemanticAnswerCache()
+    generation = cache.generation(None)
+    cache.invalidate()
+    assert not cache.store("Câu hỏi?", VECTOR, "Câu trả lời", [], generation=generation)
+
+
+def test_query_racing_ingestion_does_not_cache_stale_answer(rag, tmp_path):
+    path = tmp_path / "lecture1.txt"
+    path.write_text("Ngăn xếp là cấu trúc dữ liệu vào sau ra trước. " * 20, encoding="utf-8")
+    rag.ingest_document(str(path), course_code="IT3100")
+
+    retrieve = rag._retrieve
+
+    async def retrieve_then_reindex(*args, **kwargs):
+        docs = await retrieve(*args, **kwargs)
+        # The course's documents change after this query retrieved from them
+        path.write_text("Hàng đợi là cấu trúc dữ liệu vào trước ra trước. " * 20, encoding="utf-8")
+        rag.ingest_document(str(path), course_code="IT3100")
+        return docs
+
+    rag._retrieve = retrieve_then_reindex
+    assert asyncio.run(rag.query("Ngăn xếp là gì?", course_code="IT3100"))["status"] == "success"
+    assert rag.answer_cache.get_stats()["entries"] == 0
+    assert rag.answer_cache.get_stats()["stale_stores"] == 1
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from services.ragService import parse_chat_history
+
+FIRST_TURN = ("Đạo hàm là gì?", "Đạo hàm đo tốc độ thay đổi của hàm số.")
+
+
+def test_question_answer_objects():
+    history = [{"question": FIRST_TURN[0], "answer": FIRST_TURN[1]}]
+    assert parse_chat_history(history) == [FIRST_TURN]
+
+
+def test_pairs():
+    assert parse_chat_history([list(FIRST_TURN)]) == [FIRST_TURN]
+
+
+def test_role_content_messages_are_paired():
+    history = [
+        {"role": "assistant", "content": "Tài liệu đã được tải lên."},
+        {"role": "user", "content": FIRST_TURN[0]},
+        {"role": "assistant", "content": FIRST_TURN[1]},
+        {"role": "user", "content": "Câu hỏi chưa có trả lời"},
+    ]
+    assert parse_chat_history(history) == [
+        ("", "Tài liệu đã được tải lên."),
+        FIRST_TURN,
+        ("Câu hỏi chưa có trả lời", ""),
+    ]
+
+
+@pytest.mark.parametrize("history", [
+    "not a list",
+    [{"role": "system", "content": "x"}],
+    [{"role": "user", "content": 1}],
+    [["only one"]],
+    [{"text": "x"}],
+])
+def test_unknown_shapes_are_rejected(history):
+    with pytest.raises(ValueError):
+        parse_chat_history(history)
+
+
+@pytest.mark.parametrize("condense_mode", ["condense", "recent_turns"])
+def test_follow_up_with_client_history(rag, condense_mode):
+    context = {"chat_history": [
+        {"role": "user", "content": FIRST_TURN[0]},
+        {"role": "assistant", "content": FIRST_TURN[1]},
+    ]}
+    result = asyncio.run(rag.query("Cho ví dụ?", context, condense_mode=condense_mode))
+    assert result["status"] == "success"
+
+
+def test_session_history_takes_precedence(rag):
+    rag.sessions.append_turn("session-1", *FIRST_TURN)
+    context = {"chat_history": [["Câu khác", "Trả lời khác"]]}
+    assert rag._get_chat_history(context, "session-1") == [FIRST_TURN]
+    # An unknown or expired session falls back to what the client sent
+    assert rag._get_chat_history(context, "session-2") == [("Câu khác", "Trả lời khác")]
+
+
+def test_query_route_rejects_unknown_history():
+    from routes.rag import router
+
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).post("/api/rag/query", json={
+        "message": "Cho ví dụ?",
+        "context": {"chat_history": [{"text": "x"}]},
+    })
+    assert response.status_code == 400
@@ -0,0 +1,114 @@
+import asyncio
+from typing import Any, AsyncIterator, List, Optional
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from benchmarks.fakes import FakeChatModel
+
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, is_dependency_failure, OPEN, CLOSED
+
+
+def fail(error: Exception):
+    raise error
+
+
+async def stalled_stream(first_items: List[str]) -> AsyncIterator[str]:
+    for item in first_items:
+        yield item
+    await asyncio.sleep(3600)
+    yield "never"
+
+
+class StalledChatModel(FakeChatModel):
+    """Streams one token, then stops answering."""
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for word in stalled_stream(["Đạo "]):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+
+
+async def consume(stream: AsyncIterator[Any]) -> List[Any]:
+    return [item async for item in stream]
+
+
+def test_caller_errors_do_not_open_the_circuit():
+    breaker = CircuitBreaker("test", min_calls=5)
+    for _ in range(10):
+        with pytest.raises(ValueError):
+            breaker.call(fail, ValueError("bad chat_history"))
+    assert breaker.get_stats()["state"] == CLOSED
+    assert breaker.failures == 0
+
+
+def test_timeouts_open_the_circuit():
+    breaker = CircuitBreaker("test", min_calls=5)
+    for _ in range(5):
+        with pytest.raises(TimeoutError):
+            breaker.call(fail, TimeoutError())
+    assert breaker.get_stats()["state"] == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: None)
+
+
+def test_dependency_failure_classification():
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+    def status_error(status: int) -> openai.APIStatusError:
+        return openai.APIStatusError("error", response=httpx.Response(status, request=request), body=None)
+
+    assert is_dependency_failure(asyncio.TimeoutError())
+    assert is_dependency_failure(openai.APIConnectionError(request=request))
+    assert is_dependency_failure(httpx.ConnectError("refused"))
+    assert is_dependency_failure(status_error(503))
+    assert is_dependency_failure(status_error(429))
+    assert not is_dependency_failure(status_error(400))
+    assert not is_dependency_failure(ValueError("Unsupported chat history format"))
+
+
+def test_malformed_history_does_not_open_chat_model(rag):
+    for _ in range(6):
+        result = asyncio.run(rag.query("Cho ví dụ?", {"chat_history": [{"text": "x"}]}))
+        assert result["status"] == "error"
+    assert rag.breakers["chat_model"].get_stats()["state"] == CLOSED
+    assert asyncio.run(rag.query("Đạo hàm là gì?"))["status"] == "success"
+
+
+@pytest.mark.parametrize("first_items", [[], ["Đạo ", "hàm "]])
+def test_stalled_stream_times_out_as_a_failure(first_items):
+    breaker = CircuitBreaker("test", min_calls=1, min_timeout=0.05, max_timeout=0.05)
+    received = []
+
+    async def run():
+        async for item in breaker.stream_async(stalled_stream(first_items)):
+            received.append(item)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
+    assert received == first_items
+    assert breaker.failures == 1
+    assert breaker.get_stats()["state"] == OPEN
+
+
+def test_completed_stream_is_a_success():
+    async def stream():
+        for item in ["Đạo ", "hàm "]:
+            await asyncio.sleep(0.01)
+            yield item
+
+    breaker = CircuitBreaker("test", min_timeout=0.05, max_timeout=0.05)
+    assert asyncio.run(consume(breaker.stream_async(stream()))) == ["Đạo ", "hàm "]
+    assert breaker.successes == 1
+
+
+def test_stalled_answer_stream_ends_with_an_error(rag):
+    rag.llm = StalledChatModel()
+    rag.breakers["chat_model"] = CircuitBreaker("chat_model", min_calls=1, min_timeout=0.05, max_timeout=0.05)
+
+    events = asyncio.run(consume(rag.stream_query("Đạo hàm là gì?")))
+    assert [event for event, _ in events] == ["sources", "token", "error"]
+    assert rag.breakers["chat_model"].get_stats()["state"] == OPEN
@@ -0,0 +1,39 @@
+import asyncio
+
+from services.ingestion import IngestionJob
+
+LECTURE = "Bài giảng về cấu trúc dữ liệu: danh sách liên kết, ngăn xếp và hàng đợi. " * 20
+
+
+def write_lecture(tmp_path, folder: str, text: str = LECTURE) -> str:
+    path = tmp_path / folder / "lecture1.txt"
+    path.parent.mkdir()
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_same_file_name_in_two_courses(rag, tmp_path):
+    for course in ("IT3100", "MI1111"):
+        result = rag.ingest_document(write_lecture(tmp_path, course), source="lecture1.txt", course_code=course)
+        assert result["status"] == "success"
+        assert result["document_id"] == f"{course}/lecture1.txt"
+
+    for course in ("IT3100", "MI1111"):
+        assert [d["document_id"] for d in rag.registry.list_documents(course)] == [f"{course}/lecture1.txt"]
+        result = asyncio.run(rag.get_relevant_context("ngăn xếp và hàng đợi", course_code=course))
+        assert result["status"] == "success"
+        assert {c["metadata"]["course_code"] for c in result["contexts"]} == {course}
+
+
+def test_explicit_document_id_moves_between_courses(rag, tmp_path):
+    path = write_lecture(tmp_path, "shared")
+    rag.ingest_document(path, document_id="syllabus", course_code="IT3100")
+    rag.ingest_document(path, document_id="syllabus", course_code="MI1111")
+
+    assert rag.registry.list_documents("IT3100") == []
+    assert [d["document_id"] for d in rag.registry.list_documents("MI1111")] == ["syllabus"]
+
+
+def test_upload_job_default_id_is_scoped_by_course():
+    assert IngestionJob("/tmp/upload", "lecture1.txt", course_code="IT3100").document_id == "IT3100/lecture1.txt"
+    assert IngestionJob("/tmp/upload", "lecture1.txt").document_id == "lecture1.txt"
@@ -0,0 +1,41 @@
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from services.reranking import VectorRetriever, cosine_relevance
+from services.vector_store import NumpyVectorStore
+
+QUERY = "đạo hàm"
+VECTORS = {
+    QUERY: [1.0, 0.0],
+    "Đạo hàm đo tốc độ thay đổi.": [1.0, 0.0],
+    "Đạo hàm cho biết tốc độ thay đổi.": [0.98, 0.199],
+    "Lịch thi cuối kỳ.": [0.1, 0.995],
+}
+
+
+class TableEmbeddings(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [VECTORS[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return VECTORS[text]
+
+
+def test_cosine_relevance():
+    vectors = np.array([[2.0, 0.0], [0.0, 3.0], [1.0, 1.0]])
+    assert cosine_relevance(vectors, [1.0, 0.0]) == pytest.approx([1.0, 0.0, 2 ** -0.5])
+
+
+def test_mmr_relevance_is_similarity_not_rank(tmp_path):
+    store = NumpyVectorStore(TableEmbeddings(), str(tmp_path))
+    texts = [text for text in VECTORS if text != QUERY]
+    store.add_texts(texts, [{"chunk_id": str(i)} for i in range(len(texts))], ids=[str(i) for i in range(len(texts))])
+    retriever = VectorRetriever(vector_store=store, k=2, fetch_k=3, rerank=True, mmr_lambda=0.6)
+
+    # By rank the unrelated chunk would be worth a third of the best match and
+    # win on diversity; by similarity it is barely relevant
+    docs = retriever.invoke(QUERY)
+    assert [doc.page_content for doc in docs] == texts[:2]